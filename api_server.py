@@ -0,0 +1,323 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from blood import BLOOD_GROUPS, COMPATIBLE_DONORS
+from indexes import normalize_blood_group
+from perf import recorder
+from storage import DATE_FIELDS, ENTITIES
+from transfer import EXPORT_COLUMNS
+
+# Read-only HTTP/JSON API over a storage, e.g. for a phone page of the blood-request hotline.
+#   GET /api/members?offset=0&limit=50&q=rahim
+#   GET /api/donations?from=2024-01-01&to=2024-12-31
+#   GET /api/blood_donations/12
+#   GET /api/search?q=rahim&limit=10
+#   GET /api/eligible?blood_group=O-&on=2024-06-01&recipient=1
+# The server runs on its own thread and event loop, so the Tk mainloop never waits for it.
+# Queries run on a small thread pool and go through the storage's lock, sharing its in-memory
+# indexes with the GUI. Member passwords are never sent.
+
+# Address the server listens on; only this machine can connect by default
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+
+# Records per page when the request does not say, and the most it may ask for
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Threads running queries. They take turns on the storage lock, and two keep one query
+# encoding its JSON while the next one runs.
+API_WORKERS = 2
+
+# Longest request head accepted, and seconds an idle keep-alive connection stays open
+MAX_HEADER_BYTES = 16384
+IDLE_TIMEOUT = 15.0
+
+ENDPOINTS = ENTITIES + ("search", "eligible")
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def int_param(params, name, default, minimum=0, maximum=None):
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ApiError(400, f"{name} must be between {minimum} and {maximum}" if maximum is not None
+                       else f"{name} must be at least {minimum}")
+    return value
+
+def date_param(params, name):
+    # Dates are "YYYY-MM-DD" like everywhere else in the app
+    value = params.get(name) or None
+    if value is not None:
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise ApiError(400, f"invalid {name} date {value!r}, use YYYY-MM-DD")
+    return value
+
+def public_record(entity, record):
+    return {column: record.get(column) for column in EXPORT_COLUMNS[entity]}
+
+class ApiServer:
+    def __init__(self, store, host=API_HOST, port=API_PORT, workers=API_WORKERS):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.loop = None
+        self.server = None
+        self.executor = None
+        self.connections = set()
+        self._thread = None
+        self._error = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api/"
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        # Returns once the server listens; raises OSError when it cannot, e.g. the port is taken
+        ready = threading.Event()
+        self._error = None
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="api-worker")
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="api-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            self._thread = None
+            self.executor.shutdown(wait=False)
+            raise self._error
+
+    def stop(self):
+        # Closes the listening socket and open connections, then ends the thread
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+        self.executor.shutdown(wait=False)
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES))
+        except OSError as e:
+            self._error = e
+            self.loop.close()
+            ready.set()
+            return
+        # Port 0 asks for any free port; report the one we got
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    async def _shutdown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.connections):
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        # One connection; requests on it are answered in turn while the client keeps it alive
+        self.connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, self._error_body("request head too large"), False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self._send(writer, 400, self._error_body("malformed request line"), False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if method != "GET" or headers.get("content-length", "0") != "0" or "transfer-encoding" in headers:
+                    # Nothing here takes a request body, so the connection cannot be reused
+                    await self._send(writer, 405, self._error_body("only GET is supported"), False,
+                                     [("Allow", "GET")])
+                    break
+                status, body = await self.loop.run_in_executor(self.executor, self.respond, target)
+                await self._send(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _send(self, writer, status, body, keep_alive, extra_headers=()):
+        headers = [
+            ("Content-Type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+            ("Cache-Control", "no-store"),
+            ("Connection", "keep-alive" if keep_alive else "close"),
+        ]
+        headers.extend(extra_headers)
+        head = f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _error_body(self, message):
+        return json.dumps({"error": message}).encode("utf-8")
+
+    # Requests, answered on the worker threads
+    def respond(self, target):
+        # (status, JSON body) for a request target such as "/api/members?limit=10"
+        parts = urlsplit(target)
+        path = [unquote(part) for part in parts.path.split("/") if part]
+        params = {name: values[-1] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        # Timed per endpoint, shown in Help > Performance
+        endpoint = path[1] if len(path) > 1 and path[1] in ENDPOINTS else "other"
+        try:
+            with recorder.timer(f"api_{endpoint}"):
+                result = self.route(path, params)
+            return 200, json.dumps(result).encode("utf-8")
+        except ApiError as e:
+            return e.status, self._error_body(str(e))
+        except Exception as e:
+            return 500, self._error_body(str(e))
+
+    def route(self, path, params):
+        if path[:1] != ["api"]:
+            raise ApiError(404, "not found")
+        path = path[1:]
+        if not path:
+            return {"endpoints": [f"/api/{endpoint}" for endpoint in ENDPOINTS]}
+        if path[0] in ENTITIES and len(path) == 1:
+            return self.list_records(path[0], params)
+        if path[0] in ENTITIES and len(path) == 2:
+            return self.get_record(path[0], path[1])
+        if path == ["search"]:
+            return self.search(params)
+        if path == ["eligible"]:
+            return self.eligible(params)
+        raise ApiError(404, "not found")
+
+    def list_records(self, entity, params):
+        # One page of the records matching q and the from/to dates, as shown in the tabs
+        offset = int_param(params, "offset", 0)
+        limit = int_param(params, "limit", PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        query = params.get("q", "").strip().lower()
+        date_from = date_param(params, "from")
+        date_to = date_param(params, "to")
+        if (date_from or date_to) and entity not in DATE_FIELDS:
+            raise ApiError(400, f"{entity} have no date")
+        # The first search of an entity builds its index without holding the storage lock
+        # throughout, so the query runs outside it. Records are views into the storage, so
+        # they are copied under the lock.
+        rows = self.store.query(entity, query, date_from, date_to)
+        with self.store.lock:
+            total = len(rows)
+            items = [public_record(entity, record) for record in rows[offset:offset + limit]]
+        return {
+            "entity": entity,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next": offset + limit if offset + limit < total else None,
+            "items": items,
+        }
+
+    def get_record(self, entity, record_id):
+        try:
+            record_id = int(record_id)
+        except ValueError:
+            raise ApiError(404, "not found")
+        with self.store.lock:
+            record = self.store.get(entity, record_id)
+            if record is None:
+                raise ApiError(404, f"no {entity} record {record_id}")
+            return public_record(entity, record)
+
+    def search(self, params):
+        # The first limit matches of q in every entity, with their counts
+        query = params.get("q", "").strip().lower()
+        if not query:
+            raise ApiError(400, "q is required")
+        limit = int_param(params, "limit", 10, 1, MAX_PAGE_SIZE)
+        results = {}
+        for entity in ENTITIES:
+            rows = self.store.search(entity, query)
+            with self.store.lock:
+                results[entity] = {
+                    "total": len(rows),
+                    "items": [public_record(entity, record) for record in rows[:limit]],
+                }
+        return {"query": query, "results": results}
+
+    def eligible(self, params):
+        # Donors of blood_group who may donate on day on (default today). With recipient=1, the
+        # donors a recipient of blood_group can receive from, most recent donors first.
+        # "+" in a query string means a space, and a blood group has no spaces, so "O " is "O+".
+        group = normalize_blood_group(params.get("blood_group", "").replace(" ", "+"))
+        if group not in BLOOD_GROUPS:
+            raise ApiError(400, f"blood_group must be one of {', '.join(BLOOD_GROUPS)}")
+        on = date_param(params, "on")
+        offset = int_param(params, "offset", 0)
+        limit = int_param(params, "limit", PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        recipient = params.get("recipient", "") not in ("", "0", "false")
+        with self.store.lock:
+            index = self.store.eligibility()
+            if recipient:
+                donors = index.compatible(group, on, offset + limit)
+                total = sum(index.count_eligible(donor_group, on) for donor_group in COMPATIBLE_DONORS[group])
+            else:
+                donors = index.eligible(group, on, offset + limit)
+                total = index.count_eligible(group, on)
+        return {
+            "blood_group": group,
+            "recipient": recipient,
+            "on": on,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next": offset + limit if offset + limit < total else None,
+            "items": [vars(donor) for donor in donors[offset:]],
+        }
@@ -0,0 +1,408 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import date
+
+# Benchmarks for the data and UI paths, with data from a seeded generator so runs compare:
+#   python benchmark.py                                   # 10k and 100k rows
+#   python benchmark.py --sizes 10000 100000 1000000 --output results.json
+# Results are JSON, one entry per benchmark and size, plus the git revision they were taken at.
+#
+# The UI paths run against stub tkinter/customtkinter modules, so no display (or Xvfb) is
+# needed. They measure the app's own work (queries, row formatting, the visible Treeview rows),
+# not Tk drawing.
+
+DEFAULT_SIZES = [10000, 100000]
+SEED = 1234
+
+FIRST_NAMES = ["Rahim", "Karim", "Salma", "Nasir", "Abdul", "Fatema", "Jahid", "Sumon", "Rina", "Mitu",
+               "Tanvir", "Sadia", "Arif", "Nusrat", "Kamal", "Hasan", "Akash", "Sangram", "Kabil", "Shirin"]
+LAST_NAMES = ["Uddin", "Begum", "Ahmed", "Hossain", "Islam", "Khan", "Rahman", "Akter", "Sarker",
+              "Chowdhury", "Das", "Roy", "Mia", "Ali", "Haque", "Sultana"]
+PLACES = ["Dhaka", "Chattogram", "Sylhet", "Khulna", "Rajshahi", "Barishal", "Rangpur", "Mymensingh"]
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+# Roughly how common each group is
+BLOOD_WEIGHTS = [27, 1, 34, 1, 8, 1, 27, 1]
+
+def generate(size, seed=SEED):
+    # Database in the DATABASE_FILE layout with size donations and size blood donations,
+    # size // 10 members and size // 100 events
+    rng = random.Random(seed)
+    first_day = date(2020, 1, 1).toordinal()
+    days = date(2025, 12, 31).toordinal() - first_day
+
+    def name():
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+    def day():
+        return date.fromordinal(first_day + rng.randrange(days)).isoformat()
+
+    members = []
+    for i in range(1, size // 10 + 1):
+        member_name = name()
+        members.append({
+            "id": i,
+            "name": member_name,
+            "email": f"{member_name.lower().replace(' ', '.')}{i}@example.org",
+            "phone": f"01{rng.randrange(10 ** 9):09d}",
+            "address": f"{rng.randrange(1, 200)} Road, {rng.choice(PLACES)}",
+            "password": "password",
+        })
+    events = [{
+        "id": i,
+        "name": f"{rng.choice(['Blood Drive', 'Tree Planting', 'Clean Up', 'Fund Raiser'])} {i}",
+        "date": day(),
+        "location": rng.choice(PLACES),
+        "description": "",
+    } for i in range(1, size // 100 + 1)]
+    # Donors come back, so the donor names repeat like in real data
+    donors = [name() + (f" {i}" if i % 3 else "") for i in range(max(1, size // 5))]
+    donations = [{
+        "id": i,
+        "donor_name": rng.choice(donors),
+        "amount": float(rng.choice([100, 200, 500, 1000, 2000, 5000])),
+        "date": day(),
+    } for i in range(1, size + 1)]
+    blood_donations = [{
+        "id": i,
+        "donor_name": rng.choice(donors),
+        "blood_group": rng.choices(BLOOD_GROUPS, BLOOD_WEIGHTS)[0],
+        "donation_date": day(),
+    } for i in range(1, size + 1)]
+    return {
+        "members": members,
+        "events": events,
+        "donations": donations,
+        "blood_donations": blood_donations,
+        "users": {"ADMIN": "admin123"},
+    }
+
+# Stub UI toolkit
+class StubWidget:
+    # Accepts any widget call; entries keep their text so the app can read its search fields
+    def __init__(self, *args, **kwargs):
+        self.text = ""
+        self.options = dict(kwargs)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def get(self, *args):
+        return self.text
+
+    def insert(self, index, text, *args, **kwargs):
+        if isinstance(index, int):
+            self.text = self.text[:index] + str(text) + self.text[index:]
+
+    def delete(self, *args):
+        self.text = ""
+
+    def set(self, value, *args):
+        self.text = value
+
+    def configure(self, **kwargs):
+        self.options.update(kwargs)
+
+    config = configure
+
+    def cget(self, key):
+        return self.options.get(key)
+
+    def selection(self):
+        return ()
+
+    def winfo_children(self):
+        return []
+
+    def winfo_height(self):
+        return 600
+
+    def winfo_screenwidth(self):
+        return 1920
+
+    def winfo_screenheight(self):
+        return 1080
+
+class StubRoot(StubWidget):
+    # Keeps after() callbacks for run_pending instead of running an event loop
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = {}
+        self.next_timer = 0
+
+    def after(self, ms, func=None, *args):
+        self.next_timer += 1
+        self.pending[self.next_timer] = (ms, func, args)
+        return self.next_timer
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, timer):
+        self.pending.pop(timer, None)
+
+    def run_pending(self, max_ms=1000):
+        # Runs every callback due within max_ms without waiting for it; returns how many ran
+        due = [(timer, entry) for timer, entry in self.pending.items() if entry[0] <= max_ms]
+        for timer, (ms, func, args) in due:
+            del self.pending[timer]
+            if func is not None:
+                func(*args)
+        return len(due)
+
+class StubTabview(StubWidget):
+    def __init__(self, *args, command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.command = command
+        self.names = []
+
+    def add(self, name):
+        self.names.append(name)
+        self.text = self.text or name
+        return StubWidget()
+
+    def tab(self, name):
+        return StubWidget()
+
+    def set(self, name):
+        self.text = name
+        if self.command:
+            self.command()
+
+class StubVar:
+    def __init__(self, master=None, value=None, **kwargs):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+def install_ui_stubs():
+    # Replaces tkinter and customtkinter before main.py is imported
+    tk = types.ModuleType("tkinter")
+    for name in ("Tk", "Toplevel", "Menu", "Frame", "Label", "Scrollbar"):
+        setattr(tk, name, StubWidget)
+    tk.StringVar = tk.IntVar = tk.BooleanVar = StubVar
+    tk.TclError = Exception
+    messagebox = types.ModuleType("tkinter.messagebox")
+    for name in ("showinfo", "showwarning", "showerror"):
+        setattr(messagebox, name, lambda *args, **kwargs: None)
+    messagebox.askyesno = lambda *args, **kwargs: False
+    filedialog = types.ModuleType("tkinter.filedialog")
+    filedialog.askopenfilename = filedialog.asksaveasfilename = lambda *args, **kwargs: ""
+    ttk = types.ModuleType("tkinter.ttk")
+    ttk.Treeview = ttk.Scrollbar = ttk.Style = StubWidget
+    tk.messagebox, tk.filedialog, tk.ttk = messagebox, filedialog, ttk
+    ctk = types.ModuleType("customtkinter")
+    for name in ("CTkToplevel", "CTkLabel", "CTkEntry", "CTkButton", "CTkFrame", "CTkRadioButton",
+                 "CTkOptionMenu", "CTkCheckBox", "CTkProgressBar"):
+        setattr(ctk, name, StubWidget)
+    ctk.CTk = StubRoot
+    ctk.CTkTabview = StubTabview
+    ctk.StringVar = StubVar
+    ctk.set_appearance_mode = ctk.set_default_color_theme = lambda *args: None
+    sys.modules.update({
+        "tkinter": tk,
+        "tkinter.messagebox": messagebox,
+        "tkinter.filedialog": filedialog,
+        "tkinter.ttk": ttk,
+        "customtkinter": ctk,
+    })
+
+# Measuring
+def measure(results, name, size, func, repeat, rows=None, setup=None):
+    # Runs func repeat times (after setup, which is not timed) and records the median and best time.
+    # The first run is kept as well since it includes building indexes and caches.
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    result = {
+        "benchmark": name,
+        "size": size,
+        "median": statistics.median(times),
+        "min": min(times),
+        "first": times[0],
+        "runs": repeat,
+    }
+    if rows is not None:
+        result["rows"] = rows
+    results.append(result)
+    print(f"{name:<32} {size:>9,}  median {result['median'] * 1000:10.2f} ms  min {result['min'] * 1000:10.2f} ms",
+          file=sys.stderr)
+    return result
+
+def wait_for_searches(app, root, timeout=120.0):
+    # Drives the stub root until the search worker has handed back every result
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        root.run_pending()
+        scheduler = app.search_scheduler
+        if not scheduler._outstanding and not scheduler._timers:
+            return
+        time.sleep(0.001)
+    raise TimeoutError("search did not finish")
+
+def bench_data(results, size, data, directory, repeat):
+    import storage
+    import transfer
+
+    database_file = os.path.join(directory, "organization_data.json")
+    journal_file = os.path.join(directory, "organization_data.journal")
+    snapshot_file = os.path.join(directory, "organization_data.snap")
+    lock_file = os.path.join(directory, "organization_data.lock")
+    rows = sum(len(data[entity]) for entity in storage.ENTITIES)
+
+    measure(results, "save_database", size, lambda: storage.save_database(data, database_file, journal_file, lock_file),
+            repeat, rows)
+    measure(results, "load_database", size, lambda: storage.load_database(database_file, journal_file, lock_file),
+            repeat, rows)
+
+    def open_json():
+        return storage.JsonStorage(database_file, journal_file, snapshot_file=None, lock_file=lock_file)
+
+    def open_snapshot():
+        # Opening alone leaves the snapshot undecoded, so one count per entity is part of the path
+        store = storage.JsonStorage(database_file, journal_file, snapshot_file=snapshot_file, lock_file=lock_file)
+        for entity in storage.ENTITIES:
+            store.count(entity)
+        return store
+
+    def remove_snapshot():
+        if os.path.exists(snapshot_file):
+            os.remove(snapshot_file)
+
+    measure(results, "open_storage_json", size, lambda: open_json().count("donations"), repeat, rows)
+    open_json().checkpoint()
+    measure(results, "open_storage_snapshot", size, open_snapshot, repeat, rows)
+
+    store = open_json()
+    # The in-memory copy written by File > Backup Data
+    measure(results, "backup_export", size, store.export_data, repeat, rows)
+    # File > Export Data, one CSV file per entity
+    export_file = os.path.join(directory, "export.csv")
+    for entity in storage.ENTITIES:
+        measure(results, f"export_csv:{entity}", size,
+                lambda: transfer.export_csv(store, entity, export_file), repeat, store.count(entity))
+    measure(results, "checkpoint", size, store.checkpoint, repeat, rows)
+    remove_snapshot()
+
+    collection = store.collections["donations"]
+    measure(results, "allocate_id_x10000", size, lambda: [collection.allocate_id() for _ in range(10000)], repeat)
+    donation = {"donor_name": "Benchmark Donor", "amount": 100.0, "date": "2025-06-01"}
+    measure(results, "insert_x100", size, lambda: [store.insert("donations", donation) for _ in range(100)], repeat)
+    store.checkpoint()
+    return store
+
+def bench_ui(results, size, store, repeat):
+    import main
+
+    root = StubRoot()
+    app = None
+
+    def startup():
+        nonlocal app
+        app = main.OrganizationApp(root, store)
+        root.run_pending(0)
+
+    measure(results, "startup", size, startup, 1)
+    for name in list(app.tab_builders):
+        measure(results, f"build_tab:{name}", size, lambda: app.tabview.set(name), 1)
+
+    for entity in ("members", "events", "donations", "blood_donations"):
+        refresh = getattr(app, f"refresh_{entity}")
+        measure(results, f"refresh_{entity}", size, refresh, repeat, store.count(entity))
+
+    searches = [
+        ("members", app.member_search_entry, None, "rahim"),
+        ("events", app.event_search_entry, app.event_date_entries, "blood"),
+        ("donations", app.donation_search_entry, app.donation_date_entries, "karim"),
+        ("blood_donations", app.blood_donation_search_entry, app.blood_donation_date_entries, "o-"),
+    ]
+    for entity, entry, date_entries, query in searches:
+        search = getattr(app, f"search_{entity}")
+        clear = getattr(app, f"clear_{entity[:-1]}_search")
+
+        def run(search=search):
+            search()
+            wait_for_searches(app, root)
+
+        def set_query(entry=entry, date_entries=date_entries, query=query, clear=clear, dates=None):
+            clear()
+            entry.insert(0, query)
+            if dates:
+                app.set_date_filter(date_entries, *dates)
+
+        measure(results, f"search_{entity}", size, run, repeat, setup=set_query)
+        if date_entries is not None:
+            dates = ("2024-01-01", "2024-12-31")
+            measure(results, f"search_{entity}_dates", size, run, repeat,
+                    setup=lambda set_query=set_query, dates=dates: set_query(query="", dates=dates))
+        clear()
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(sizes, repeat=3, seed=SEED, ui=True):
+    if ui:
+        install_ui_stubs()
+    results = []
+    for size in sizes:
+        data = None
+
+        def make_data(size=size):
+            nonlocal data
+            data = generate(size, seed)
+
+        measure(results, "generate", size, make_data, 1)
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+            store = bench_data(results, size, data, directory, repeat)
+            del data
+            if ui:
+                bench_ui(results, size, store, repeat)
+            store.close()
+    return {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data and UI paths on generated data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="donations and blood donations per run (default: 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the median is reported")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--no-ui", action="store_true", help="only benchmark the data layer")
+    parser.add_argument("--output", help="write the JSON results here instead of to stdout")
+    args = parser.parse_args(argv)
+    report = run(args.sizes, args.repeat, args.seed, ui=not args.no_ui)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
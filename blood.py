@@ -0,0 +1,191 @@
+import heapq
+from bisect import bisect_left, insort
+from datetime import date
+from itertools import islice
+
+from indexes import normalize_blood_group
+
+# Days a donor has to wait after a whole blood donation before donating again
+DEFERRAL_DAYS = 56
+
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+
+# Red cell compatibility: recipient group -> donor groups it can receive from, identical group first
+COMPATIBLE_DONORS = {
+    "O-": ("O-",),
+    "O+": ("O+", "O-"),
+    "A-": ("A-", "O-"),
+    "A+": ("A+", "A-", "O+", "O-"),
+    "B-": ("B-", "O-"),
+    "B+": ("B+", "B-", "O+", "O-"),
+    "AB-": ("AB-", "A-", "B-", "O-"),
+    "AB+": ("AB+", "AB-", "A+", "A-", "B+", "B-", "O+", "O-"),
+}
+
+def normalize_donor_name(value):
+    # "  Rahim  Uddin" and "rahim uddin" are the same donor
+    return " ".join(str(value).split()).casefold()
+
+def parse_date(value):
+    # Day ordinal of a "YYYY-MM-DD" string, or None
+    try:
+        return date.fromisoformat(str(value)).toordinal()
+    except ValueError:
+        return None
+
+class DonorStatus:
+    # Eligibility of one donor, as returned by EligibilityIndex queries
+    def __init__(self, name, blood_group, last_donation, next_eligible, donations):
+        self.name = name
+        self.blood_group = blood_group
+        self.last_donation = last_donation
+        self.next_eligible = next_eligible
+        self.donations = donations
+
+    def eligible_on(self, day):
+        # day is a "YYYY-MM-DD" string
+        return self.next_eligible <= day
+
+class Donor:
+    def __init__(self, key):
+        self.key = key
+        # (day ordinal, record id, donor name, blood group) of each donation, sorted
+        self.donations = []
+
+    @property
+    def last(self):
+        return self.donations[-1] if self.donations else None
+
+class EligibilityIndex:
+    # Last donation and next eligible date of every blood donor, kept up to date record by record.
+    # For each blood group the donors are kept in a list sorted by next eligible date, so
+    # "eligible on day X" is a bisect plus the matching donors. A donor counts under the group
+    # of their latest donation.
+
+    def __init__(self, deferral_days=DEFERRAL_DAYS):
+        self.deferral_days = deferral_days
+        self.donors = {}
+        # blood group -> sorted [(next eligible ordinal, donor key)]
+        self.by_group = {}
+
+    # Index hooks
+    def add(self, record):
+        day = parse_date(record.get("donation_date"))
+        if day is None:
+            return
+        key = normalize_donor_name(record.get("donor_name") or "")
+        donor = self.donors.get(key)
+        if donor is None:
+            donor = self.donors[key] = Donor(key)
+        self._unlist(donor)
+        insort(donor.donations, (day, record["id"], record.get("donor_name") or "",
+                                 normalize_blood_group(record.get("blood_group") or "")))
+        self._list(donor)
+
+    def add_many(self, records):
+        # Same as add() for each record, but each donor is taken out of and put back into its
+        # group list once, and each group list is sorted once
+        changed = {}
+        for record in records:
+            day = parse_date(record.get("donation_date"))
+            if day is None:
+                continue
+            key = normalize_donor_name(record.get("donor_name") or "")
+            donor = changed.get(key)
+            if donor is None:
+                donor = self.donors.get(key)
+                if donor is None:
+                    donor = self.donors[key] = Donor(key)
+                else:
+                    self._unlist(donor)
+                changed[key] = donor
+            donor.donations.append((day, record["id"], record.get("donor_name") or "",
+                                    normalize_blood_group(record.get("blood_group") or "")))
+        groups = set()
+        for donor in changed.values():
+            donor.donations.sort()
+            group = donor.last[3]
+            self.by_group.setdefault(group, []).append(self._entry(donor))
+            groups.add(group)
+        for group in groups:
+            self.by_group[group].sort()
+
+    def remove(self, record):
+        day = parse_date(record.get("donation_date"))
+        key = normalize_donor_name(record.get("donor_name") or "")
+        donor = self.donors.get(key)
+        if day is None or donor is None:
+            return
+        self._unlist(donor)
+        position = bisect_left(donor.donations, (day, record["id"]))
+        if position < len(donor.donations) and donor.donations[position][1] == record["id"]:
+            del donor.donations[position]
+        if donor.donations:
+            self._list(donor)
+        else:
+            del self.donors[key]
+
+    def _entry(self, donor):
+        return (donor.last[0] + self.deferral_days, donor.key)
+
+    def _list(self, donor):
+        insort(self.by_group.setdefault(donor.last[3], []), self._entry(donor))
+
+    def _unlist(self, donor):
+        if not donor.donations:
+            return
+        entries = self.by_group[donor.last[3]]
+        position = bisect_left(entries, self._entry(donor))
+        if position < len(entries) and entries[position][1] == donor.key:
+            del entries[position]
+
+    def set_deferral(self, days):
+        self.deferral_days = days
+        for group in self.by_group:
+            self.by_group[group] = sorted(self._entry(self.donors[key]) for _, key in self.by_group[group])
+
+    # Queries
+    def status(self, key):
+        donor = self.donors.get(key)
+        if donor is None:
+            return None
+        day, record_id, name, group = donor.last
+        return DonorStatus(name, group, date.fromordinal(day).isoformat(),
+                           date.fromordinal(day + self.deferral_days).isoformat(), len(donor.donations))
+
+    def donor_status(self, name):
+        return self.status(normalize_donor_name(name))
+
+    def count_eligible(self, blood_group, on=None):
+        entries = self.by_group.get(normalize_blood_group(blood_group), [])
+        return bisect_left(entries, (self._day(on) + 1,))
+
+    def eligible(self, blood_group, on=None, limit=None):
+        # Donors of the group who may donate on day on (default today), those eligible longest first
+        entries = self.by_group.get(normalize_blood_group(blood_group), [])
+        end = bisect_left(entries, (self._day(on) + 1,))
+        if limit is not None:
+            end = min(end, limit)
+        return [self.status(key) for _, key in entries[:end]]
+
+    def compatible(self, recipient_group, on=None, limit=None):
+        # Donors of every group recipient_group can receive from who may donate on day on,
+        # those who donated most recently first since they are the likeliest to answer a call.
+        # Each group's eligible donors are already sorted, so the groups are merged lazily and
+        # only the first limit donors are looked at.
+        end = self._day(on) + 1
+        runs = []
+        for group in COMPATIBLE_DONORS.get(normalize_blood_group(recipient_group), ()):
+            entries = self.by_group.get(group, [])
+            runs.append(self._newest_first(entries, bisect_left(entries, (end,))))
+        matches = heapq.merge(*runs, reverse=True)
+        return [self.status(key) for _, key in islice(matches, limit)]
+
+    def _newest_first(self, entries, end):
+        for position in range(end - 1, -1, -1):
+            yield entries[position]
+
+    def _day(self, on):
+        if on is None:
+            return date.today().toordinal()
+        return on.toordinal() if isinstance(on, date) else parse_date(on)
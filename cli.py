@@ -0,0 +1,201 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from api_server import API_HOST, API_PORT, ApiServer
+from blood import DEFERRAL_DAYS
+from storage import DATE_FIELDS, ENTITIES, StorageError, open_storage
+from transfer import EXPORT_COLUMNS, export_csv, import_file
+
+# Headless entry point for reports and scheduled jobs, e.g.
+#   python cli.py stats
+#   python cli.py query donations --from 2024-01-01 --to 2024-12-31 --format json
+#   python cli.py export blood_donations blood.csv --blood-group O-
+#   python cli.py import members members.csv --skip-invalid
+#   python cli.py eligible AB+ --recipient --limit 20
+#   python cli.py eligible O- --deferral 84
+#   python cli.py serve --port 8765
+# Only the data layer is imported, never tkinter, so it runs on servers without a display.
+
+def date_argument(value):
+    # Dates are "YYYY-MM-DD" like everywhere else in the app
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, use YYYY-MM-DD")
+    return value
+
+def days_argument(value):
+    try:
+        days = int(value)
+    except ValueError:
+        days = -1
+    if days < 0:
+        raise argparse.ArgumentTypeError(f"invalid number of days {value!r}")
+    return days
+
+def write_rows(records, columns, output_format, out):
+    if output_format == "json":
+        json.dump([{column: record.get(column, "") for column in columns} for record in records], out, indent=2)
+        out.write("\n")
+        return
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([record.get(column, "") for column in columns])
+
+def cmd_query(store, args, out):
+    records = store.query(args.entity, args.search or "", args.date_from, args.date_to)
+    if args.limit is not None:
+        records = islice(records, args.limit)
+    write_rows(records, EXPORT_COLUMNS[args.entity], args.format, out)
+
+def cmd_export(store, args, out):
+    columns = args.columns.split(",") if args.columns else None
+    if columns:
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS[args.entity]]
+        if unknown:
+            raise ValueError(f"Unknown columns for {args.entity}: {', '.join(unknown)}")
+    count = export_csv(store, args.entity, args.file, columns, args.date_from, args.date_to, args.blood_group)
+    out.write(f"Exported {count:,} {args.entity} records to {args.file}\n")
+
+def cmd_import(store, args, out):
+    result = import_file(store, args.entity, args.file, args.skip_invalid)
+    for row, message in result.errors:
+        sys.stderr.write(f"Row {row}: {message}\n")
+    if result.invalid > len(result.errors):
+        sys.stderr.write(f"... and {result.invalid - len(result.errors):,} more\n")
+    if result.invalid and not args.skip_invalid:
+        out.write(f"Nothing imported: {result.invalid:,} of {result.checked:,} rows are invalid\n")
+        return 1
+    out.write(f"Imported {result.imported:,} {args.entity} records")
+    if result.invalid:
+        out.write(f", skipped {result.invalid:,} invalid rows")
+    out.write("\n")
+
+def cmd_stats(store, args, out):
+    stats = {}
+    for entity in ENTITIES:
+        if entity in DATE_FIELDS and (args.date_from or args.date_to):
+            entry = {"count": len(store.date_range(entity, args.date_from, args.date_to))}
+            if entity == "donations":
+                entry["total"] = store.range_total(entity, args.date_from, args.date_to)
+        else:
+            aggregates = store.aggregates(entity)
+            entry = {"count": aggregates.count}
+            if entity == "donations":
+                entry["total"] = aggregates.total
+            if entity == "blood_donations":
+                entry["by_group"] = dict(sorted(aggregates.by_group.items()))
+        stats[entity] = entry
+    if args.format == "json":
+        json.dump(stats, out, indent=2)
+        out.write("\n")
+        return
+    for entity, entry in stats.items():
+        line = f"{entity}: {entry['count']:,}"
+        if "total" in entry:
+            line += f" (total ${entry['total']:,.2f})"
+        out.write(line + "\n")
+        for group, count in entry.get("by_group", {}).items():
+            out.write(f"  {group or '?'}: {count:,}\n")
+
+def cmd_eligible(store, args, out):
+    if args.deferral is not None:
+        store.set_deferral(args.deferral)
+    if args.recipient:
+        donors = store.compatible_donors(args.blood_group, args.on, args.limit)
+    else:
+        donors = store.eligible_donors(args.blood_group, args.on, args.limit)
+    columns = ["name", "blood_group", "last_donation", "next_eligible", "donations"]
+    write_rows([vars(status) for status in donors], columns, args.format, out)
+
+# Seconds between checks for changes made by the app while serving
+SYNC_INTERVAL = 2.0
+
+def cmd_serve(store, args, out):
+    server = ApiServer(store, args.host, args.port)
+    server.start()
+    store.start_index_builder()
+    out.write(f"Serving {server.url} (Ctrl+C to stop)\n")
+    out.flush()
+    try:
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            store.sync()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Jaluly Green Peace Society database without the GUI")
+    parser.add_argument("--backend", choices=["json", "sqlite"], help="storage backend (default: as configured)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def date_filters(command):
+        command.add_argument("--from", dest="date_from", type=date_argument, help="first date, YYYY-MM-DD")
+        command.add_argument("--to", dest="date_to", type=date_argument, help="last date, YYYY-MM-DD")
+
+    query = commands.add_parser("query", help="print matching records")
+    query.add_argument("entity", choices=ENTITIES)
+    query.add_argument("--search", help="text to look for, as in the search boxes")
+    date_filters(query)
+    query.add_argument("--limit", type=int)
+    query.add_argument("--format", choices=["csv", "json"], default="csv")
+    query.set_defaults(run=cmd_query)
+
+    export = commands.add_parser("export", help="export records to a CSV file")
+    export.add_argument("entity", choices=ENTITIES)
+    export.add_argument("file")
+    export.add_argument("--columns", help="comma separated columns (default: all)")
+    date_filters(export)
+    export.add_argument("--blood-group", help="only this blood group (blood_donations)")
+    export.set_defaults(run=cmd_export)
+
+    imports = commands.add_parser("import", help="import records from a CSV or JSON file")
+    imports.add_argument("entity", choices=ENTITIES)
+    imports.add_argument("file")
+    imports.add_argument("--skip-invalid", action="store_true", help="import the valid rows when some are invalid")
+    imports.set_defaults(run=cmd_import)
+
+    stats = commands.add_parser("stats", help="record counts and totals")
+    date_filters(stats)
+    stats.add_argument("--format", choices=["text", "json"], default="text")
+    stats.set_defaults(run=cmd_stats)
+
+    eligible = commands.add_parser("eligible", help="blood donors who may donate")
+    eligible.add_argument("blood_group")
+    eligible.add_argument("--on", type=date_argument, help="day of the donation (default: today)")
+    eligible.add_argument("--recipient", action="store_true",
+                          help="donors compatible with a recipient of blood_group, most recent donors first")
+    eligible.add_argument("--limit", type=int)
+    eligible.add_argument("--deferral", type=days_argument, metavar="DAYS",
+                          help=f"days a donor waits between donations (default: {DEFERRAL_DAYS})")
+    eligible.add_argument("--format", choices=["csv", "json"], default="csv")
+    eligible.set_defaults(run=cmd_eligible)
+
+    serve = commands.add_parser("serve", help="serve the data read-only over HTTP/JSON")
+    serve.add_argument("--host", default=API_HOST, help=f"address to listen on (default: {API_HOST})")
+    serve.add_argument("--port", type=int, default=API_PORT, help=f"port to listen on (default: {API_PORT})")
+    serve.set_defaults(run=cmd_serve)
+    return parser
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    out = out or sys.stdout
+    store = open_storage(args.backend)
+    try:
+        return args.run(store, args, out) or 0
+    except (StorageError, OSError, ValueError) as e:
+        sys.stderr.write(f"Error: {e}\n")
+        return 1
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
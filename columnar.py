@@ -0,0 +1,335 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from datetime import date
+from itertools import compress
+
+# Column-wise storage for large entities. Every column keeps one compact array per field
+# instead of one dict per record; records are handed out as read-only RowView mappings.
+#
+# A value that a column cannot store exactly (a missing field, an int amount, a date in
+# another format, extra fields, ...) moves the whole record to the overflow dict, so
+# nothing is ever changed by storing it.
+
+class TextColumn:
+    # Interned strings, so a donor name that appears many times is stored once
+    default = ""
+
+    def __init__(self):
+        self.values = []
+
+    def encode(self, value):
+        if not isinstance(value, str):
+            raise ValueError(value)
+        return sys.intern(value)
+
+    def get(self, row):
+        return self.values[row]
+
+class FloatColumn:
+    default = 0.0
+
+    def __init__(self):
+        self.values = array("d")
+
+    def encode(self, value):
+        if type(value) is not float:
+            raise ValueError(value)
+        return value
+
+    def get(self, row):
+        return self.values[row]
+
+class DateColumn:
+    # "YYYY-MM-DD" strings kept as day ordinals
+    default = 0
+
+    def __init__(self):
+        self.values = array("l")
+        self._ordinals = {}
+        self._strings = {}
+
+    def encode(self, value):
+        ordinal = self._ordinals.get(value)
+        if ordinal is None:
+            if not isinstance(value, str):
+                raise ValueError(value)
+            day = date.fromisoformat(value)
+            if day.isoformat() != value:
+                raise ValueError(value)
+            ordinal = self._ordinals[value] = day.toordinal()
+            self._strings[ordinal] = value
+        return ordinal
+
+    def get(self, row):
+        return self._strings[self.values[row]]
+
+class CategoryColumn:
+    # Dictionary-encoded strings for fields with few distinct values, such as blood groups
+    default = 0
+
+    def __init__(self):
+        self.values = array("H")
+        self.categories = [""]
+        self._codes = {"": 0}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            if not isinstance(value, str) or len(self.categories) > 0xFFFF:
+                raise ValueError(value)
+            code = self._codes[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def get(self, row):
+        return self.categories[self.values[row]]
+
+COLUMN_TYPES = {
+    "text": TextColumn,
+    "float": FloatColumn,
+    "date": DateColumn,
+    "category": CategoryColumn,
+}
+
+class RowView(Mapping):
+    # Read-only dict-like view of one stored record; it follows later updates of the record
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        table = self.table
+        record = table.overflow.get(self.row)
+        if record is not None:
+            return record[key]
+        if key == "id":
+            return table.ids[self.row]
+        column = table.columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column.get(self.row)
+
+    def __iter__(self):
+        record = self.table.overflow.get(self.row)
+        return iter(record if record is not None else self.table.names)
+
+    def __len__(self):
+        record = self.table.overflow.get(self.row)
+        return len(record if record is not None else self.table.names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class ColumnarView:
+    # Sequence of the live records in insertion order; RowViews are created on access
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [RowView(self.table, row) for row in self.rows[index]]
+        return RowView(self.table, self.rows[index])
+
+    def __iter__(self):
+        table = self.table
+        for row in self.rows:
+            yield RowView(table, row)
+
+    def copy(self):
+        # A view that later adds and deletes leave alone, for readers on other threads
+        return ColumnarView(self.table, self.rows[:])
+
+class ColumnarCollection:
+    # Drop-in replacement for storage.Collection that stores records column by column.
+    # columns maps each field other than "id" to one of COLUMN_TYPES.
+    # Rows are looked up by id with a binary search while ids only ever grow, which is the
+    # normal case; otherwise a dict of positions takes over. Deleted rows stay behind as
+    # dead rows until the data is next loaded.
+
+    def __init__(self, columns, records=(), next_id=None):
+        self.names = ("id",) + tuple(columns)
+        self.columns = {name: COLUMN_TYPES[kind]() for name, kind in columns.items()}
+        self._encoders = [(name, column.encode) for name, column in self.columns.items()]
+        self._arrays = [column.values for column in self.columns.values()]
+        self._defaults = [column.default for column in self.columns.values()]
+        self.ids = array("q")
+        self.alive = bytearray()
+        self.overflow = {}
+        self.live = 0
+        self._positions = None
+        self.indexes = []
+        self._view = None
+        # A table from the binary snapshot is only decoded once records are needed by id
+        self._table = records if getattr(records, "lazy", False) else None
+        if self._table is None:
+            for record in records:
+                self._append(record)
+            max_id = max(self.ids, default=0)
+        else:
+            max_id = self._table.max_id
+        self.next_id = max(next_id or 1, max_id + 1)
+
+    def _load(self):
+        if self._table is not None:
+            table = self._table
+            self._table = None
+            for record in table:
+                self._append(record)
+
+    def _append(self, record):
+        record_id = record["id"]
+        row = len(self.ids)
+        if row and record_id <= self.ids[-1] and self._positions is None:
+            self._positions = {self.ids[i]: i for i in range(row) if self.alive[i]}
+        self.ids.append(record_id)
+        self.alive.append(1)
+        encoded = self._encode(record)
+        if encoded is None:
+            encoded = self._defaults
+            self.overflow[row] = dict(record)
+        for values, value in zip(self._arrays, encoded):
+            values.append(value)
+        if self._positions is not None:
+            self._positions[record_id] = row
+        self.live += 1
+        return row
+
+    def _encode(self, record):
+        # Stored values of record's fields, or None if it has to go to the overflow
+        if len(record) != len(self.names):
+            return None
+        try:
+            return [encode(record[name]) for name, encode in self._encoders]
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    def _write(self, row, record):
+        encoded = self._encode(record)
+        if encoded is None:
+            self.overflow[row] = dict(record)
+            return
+        for values, value in zip(self._arrays, encoded):
+            values[row] = value
+        self.overflow.pop(row, None)
+
+    def _find(self, record_id):
+        if self._positions is not None:
+            return self._positions.get(record_id)
+        row = bisect_left(self.ids, record_id)
+        if row < len(self.ids) and self.ids[row] == record_id and self.alive[row]:
+            return row
+        return None
+
+    def __len__(self):
+        if self._table is not None:
+            return len(self._table)
+        return self.live
+
+    def __iter__(self):
+        self._load()
+        alive = self.alive
+        for row in range(len(self.ids)):
+            if alive[row]:
+                yield RowView(self, row)
+
+    def __contains__(self, record_id):
+        self._load()
+        return self._find(record_id) is not None
+
+    def get(self, record_id):
+        self._load()
+        row = self._find(record_id)
+        return RowView(self, row) if row is not None else None
+
+    def record_ids(self):
+        # Ids of the live records in insertion order
+        self._load()
+        return list(compress(self.ids, self.alive))
+
+    def view(self):
+        if self._table is not None:
+            return self._table
+        if self._view is None:
+            alive = self.alive
+            self._view = ColumnarView(self, array("l", (row for row in range(len(self.ids)) if alive[row])))
+        return self._view
+
+    def add_index(self, index):
+        for record in self:
+            index.add(record)
+        self.indexes.append(index)
+
+    def allocate_id(self):
+        record_id = self.next_id
+        self.next_id += 1
+        return record_id
+
+    def add(self, record):
+        self._load()
+        record_id = record["id"]
+        if self._find(record_id) is not None:
+            self.remove(record_id)
+        row = self._append(record)
+        if record_id >= self.next_id:
+            self.next_id = record_id + 1
+        if self._view is not None:
+            self._view.rows.append(row)
+        record = RowView(self, row)
+        for index in self.indexes:
+            index.add(record)
+        return record
+
+    def update(self, record_id, fields):
+        self._load()
+        row = self._find(record_id)
+        if row is None:
+            return None
+        record = RowView(self, row)
+        for index in self.indexes:
+            index.remove(record)
+        values = dict(record)
+        values.update(fields)
+        values["id"] = record_id
+        self._write(row, values)
+        for index in self.indexes:
+            index.add(record)
+        return record
+
+    def remove(self, record_id):
+        self._load()
+        row = self._find(record_id)
+        if row is None:
+            return None
+        record = dict(RowView(self, row))
+        for index in self.indexes:
+            index.remove(RowView(self, row))
+        self.alive[row] = 0
+        self.live -= 1
+        # The overflow record stays with the dead row, so RowViews handed out earlier, e.g. in
+        # a search result still on screen, keep reading the values they had
+        if self._positions is not None:
+            del self._positions[record_id]
+        if self._view is not None:
+            # The view lists its rows in ascending order
+            rows = self._view.rows
+            position = bisect_left(rows, row)
+            del rows[position]
+        return record
+
+    def apply(self, entry):
+        # Replays one journal entry
+        record = entry["record"]
+        if entry["op"] == "delete":
+            self.remove(record["id"])
+        elif record["id"] in self:
+            self.update(record["id"], record)
+        else:
+            self.add(record)
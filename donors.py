@@ -0,0 +1,211 @@
+from collections import Counter
+from difflib import SequenceMatcher
+
+from blood import normalize_donor_name
+
+# Donor identity across the data: donations and blood donations only name their donor in
+# free text, so a donor is identified by the normalized donor_name and linked to the members
+# whose normalized name is the same.
+
+# Entities naming a donor, and the field holding the name
+DONOR_FIELDS = {
+    "donations": "donor_name",
+    "blood_donations": "donor_name",
+}
+
+# Similarity (0 to 1) from which two donor names are taken for the same person
+MATCH_THRESHOLD = 0.88
+
+# Blocking keys shared by more names than this say nothing about them and are skipped
+MAX_BLOCK = 500
+
+class DonorIndex:
+    # Posting lists of the donations of every donor, plus the members with each name.
+    # One PostingHook per entity is attached to the collections; lookups by donor are O(k)
+    # in the donor's own donations.
+
+    def __init__(self):
+        # donor key -> {entity: {record id: None}}, ids in insertion order
+        self.postings = {}
+        # donor key -> {member id: None}
+        self.members = {}
+
+    def hook(self, entity):
+        return PostingHook(self, entity)
+
+    def link(self, entity, record_id, name):
+        key = normalize_donor_name(name)
+        if entity == "members":
+            self.members.setdefault(key, {})[record_id] = None
+        else:
+            self.postings.setdefault(key, {}).setdefault(entity, {})[record_id] = None
+
+    def unlink(self, entity, record_id, name):
+        key = normalize_donor_name(name)
+        if entity == "members":
+            ids = self.members.get(key)
+            if ids is not None:
+                ids.pop(record_id, None)
+                if not ids:
+                    del self.members[key]
+            return
+        entities = self.postings.get(key)
+        if entities is None or entity not in entities:
+            return
+        entities[entity].pop(record_id, None)
+        if not entities[entity]:
+            del entities[entity]
+            if not entities:
+                del self.postings[key]
+
+    # Queries
+    def history(self, name):
+        # [(entity, record id)] of every donation by the donor called name
+        entities = self.postings.get(normalize_donor_name(name), {})
+        return [(entity, record_id) for entity, ids in entities.items() for record_id in ids]
+
+    def member_for(self, name):
+        # Id of the member a donor name links to, or None when no single member has that name
+        ids = self.members.get(normalize_donor_name(name), {})
+        return next(iter(ids)) if len(ids) == 1 else None
+
+    def keys(self):
+        # Every known donor and member name, normalized
+        return set(self.postings) | set(self.members)
+
+class PostingHook:
+    # Index hooks of one entity, feeding a DonorIndex
+    def __init__(self, index, entity):
+        self.index = index
+        self.entity = entity
+        self.field = DONOR_FIELDS.get(entity, "name")
+
+    def add(self, record):
+        self.index.link(self.entity, record["id"], record.get(self.field) or "")
+
+    def remove(self, record):
+        self.index.unlink(self.entity, record["id"], record.get(self.field) or "")
+
+def blocking_keys(key):
+    # Names are only compared when they share a blocking key: the first three letters of a
+    # word, or of the word without its vowels, so "rahim" and "rahem" still meet
+    blocks = set()
+    for word in key.replace(".", " ").split():
+        if len(word) < 3:
+            continue
+        blocks.add(word[:3])
+        consonants = word[0] + "".join(c for c in word[1:] if c not in "aeiouy")
+        if len(consonants) >= 3:
+            blocks.add("~" + consonants[:3])
+    return blocks
+
+class NameForm:
+    # A name with its words sorted, so word order does not matter ("uddin rahim" is "rahim uddin"),
+    # and its letter counts for a cheap upper bound on the similarity
+    __slots__ = ("text", "letters")
+
+    def __init__(self, key):
+        self.text = " ".join(sorted(key.split()))
+        self.letters = Counter(self.text)
+
+def similarity(a, b, threshold=0.0):
+    # Similarity of two NameForms; pairs that cannot reach threshold are cut short and scored 0
+    size = len(a.text) + len(b.text)
+    if 2 * min(len(a.text), len(b.text)) < threshold * size:
+        return 0.0
+    if 2 * sum((a.letters & b.letters).values()) < threshold * size:
+        return 0.0
+    return SequenceMatcher(None, a.text, b.text, autojunk=False).ratio()
+
+def find_duplicates(keys, member_keys, threshold=MATCH_THRESHOLD):
+    # Groups of normalized names that look like the same person, as sorted lists of keys.
+    # member_keys are the names of members; two members are never grouped together.
+    blocks = {}
+    forms = {}
+    for key in keys:
+        forms[key] = NameForm(key)
+        for block in blocking_keys(key):
+            blocks.setdefault(block, []).append(key)
+
+    parent = {}
+
+    def find(key):
+        while parent.get(key, key) != key:
+            parent[key] = parent.get(parent[key], parent[key])
+            key = parent[key]
+        return key
+
+    compared = set()
+    for block in blocks.values():
+        if len(block) < 2 or len(block) > MAX_BLOCK:
+            continue
+        block.sort()
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                if (a, b) in compared:
+                    continue
+                compared.add((a, b))
+                if a in member_keys and b in member_keys:
+                    continue
+                if find(a) != find(b) and similarity(forms[a], forms[b], threshold) >= threshold:
+                    parent[find(b)] = find(a)
+
+    groups = {}
+    for key in parent:
+        groups.setdefault(find(key), set()).add(key)
+    result = []
+    for root, keys in groups.items():
+        keys.add(root)
+        # Chains of similar names must not join two members either
+        if sum(1 for key in keys if key in member_keys) <= 1:
+            result.append(sorted(keys))
+    return sorted(result)
+
+class DuplicateGroup:
+    # Donor names to merge, and the name they are merged into
+    def __init__(self, canonical, names, records):
+        self.canonical = canonical
+        self.names = names
+        # {entity: [record ids]} of the records to rename
+        self.records = records
+
+    def count(self):
+        return sum(len(ids) for ids in self.records.values())
+
+def plan_merges(storage, threshold=MATCH_THRESHOLD):
+    # DuplicateGroups for the stored donations; nothing is changed.
+    # A group takes the name of its member, if it has one, or else its most common spelling.
+    keys, member_keys = storage.donor_keys()
+    groups = []
+    for names in find_duplicates(keys, member_keys, threshold):
+        spellings = Counter()
+        records = {}
+        canonical = None
+        for key in names:
+            member = storage.donor_member(key)
+            if member is not None:
+                canonical = member["name"]
+            for entity, record in storage.donor_history(key):
+                name = record[DONOR_FIELDS[entity]]
+                spellings[name] += 1
+                records.setdefault(entity, []).append((record["id"], name))
+        if canonical is None and spellings:
+            canonical = max(spellings, key=lambda name: (spellings[name], name))
+        renames = {}
+        for entity, pairs in records.items():
+            ids = [record_id for record_id, name in pairs if name != canonical]
+            if ids:
+                renames[entity] = ids
+        if renames:
+            groups.append(DuplicateGroup(canonical, sorted(spellings), renames))
+    return groups
+
+def merge_duplicates(storage, groups):
+    # Renames the donor of every record in groups to its group's canonical name,
+    # with one storage write per entity; returns the number of records changed
+    changes = {}
+    for group in groups:
+        for entity, ids in group.records.items():
+            for record_id in ids:
+                changes.setdefault(entity, {})[record_id] = {DONOR_FIELDS[entity]: group.canonical}
+    return sum(len(storage.update_many(entity, entity_changes)) for entity, entity_changes in changes.items())
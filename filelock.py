@@ -0,0 +1,92 @@
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Seconds between attempts while another process holds a lock on Windows
+RETRY_DELAY = 0.05
+
+class FileLock:
+    # Exclusive lock shared by every process opening the same file, e.g. several app windows
+    # working on one database. Re-entrant within a process: nested acquires by the thread
+    # holding it only count up.
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def acquire(self, blocking=True):
+        # Returns False when blocking is False and another process holds the lock
+        if not self.lock.acquire(blocking):
+            return False
+        if self.depth == 0:
+            try:
+                locked = self._lock_file(blocking)
+            except OSError:
+                self.lock.release()
+                raise
+            if not locked:
+                self.lock.release()
+                return False
+        self.depth += 1
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self._unlock_file()
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def _lock_file(self, blocking):
+        self.file = open(self.filename, "a+b")
+        try:
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(self.file.fileno(), flags)
+                except BlockingIOError:
+                    self.file.close()
+                    self.file = None
+                    return False
+                return True
+            # msvcrt locks a byte range from the current position
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+                    return True
+                except OSError:
+                    if not blocking:
+                        self.file.close()
+                        self.file = None
+                        return False
+                    time.sleep(RETRY_DELAY)
+        except OSError:
+            self.file.close()
+            self.file = None
+            raise
+
+    def _unlock_file(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,268 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+class NGramIndex:
+    # Inverted trigram index over the searchable fields of one entity.
+    # Gives exactly the same results as a case-insensitive substring match on each field.
+    N = 3
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.postings = {}
+        self.texts = {}
+        # Result of the previous query, narrowed further when the user keeps typing
+        self._last_query = None
+        self._last_ids = None
+
+    def _field_texts(self, record):
+        texts = []
+        for field in self.fields:
+            value = record.get(field)
+            if value is not None:
+                texts.append(str(value).lower())
+        return tuple(texts)
+
+    def _grams(self, text):
+        return {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def add(self, record):
+        texts = self._field_texts(record)
+        record_id = record["id"]
+        self.texts[record_id] = texts
+        for text in texts:
+            for gram in self._grams(text):
+                self.postings.setdefault(gram, set()).add(record_id)
+        self._last_query = None
+
+    def add_many(self, records):
+        # Same as add() for each record. Values repeat a lot, e.g. donor names and dates, so
+        # the ids are gathered per distinct text and each text is split into grams once.
+        ids_by_text = {}
+        for record in records:
+            texts = self._field_texts(record)
+            record_id = record["id"]
+            self.texts[record_id] = texts
+            for text in texts:
+                ids = ids_by_text.get(text)
+                if ids is None:
+                    ids_by_text[text] = [record_id]
+                else:
+                    ids.append(record_id)
+        postings = self.postings
+        for text, ids in ids_by_text.items():
+            for gram in self._grams(text):
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = set(ids)
+                else:
+                    posting.update(ids)
+        self._last_query = None
+
+    def remove(self, record):
+        record_id = record["id"]
+        texts = self.texts.pop(record_id, ())
+        for text in texts:
+            for gram in self._grams(text):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(record_id)
+                    if not ids:
+                        del self.postings[gram]
+        self._last_query = None
+
+    def search(self, query):
+        # Ids of matching records in ascending order, query must already be lower-case
+        candidates = None
+        if self._last_query is not None and self._last_query in query:
+            candidates = self._last_ids
+        if len(query) >= self.N:
+            posting_lists = []
+            for gram in self._grams(query):
+                ids = self.postings.get(gram)
+                if not ids:
+                    posting_lists = None
+                    break
+                posting_lists.append(ids)
+            if posting_lists is None:
+                candidates = []
+            else:
+                posting_lists.sort(key=len)
+                if candidates is None or len(posting_lists[0]) < len(candidates):
+                    matched = set(posting_lists[0])
+                    for ids in posting_lists[1:]:
+                        matched &= ids
+                        if not matched:
+                            break
+                    candidates = sorted(matched)
+        if candidates is None:
+            candidates = sorted(self.texts)
+
+        texts = self.texts
+        result = [record_id for record_id in candidates
+                  if any(query in text for text in texts[record_id])]
+        self._last_query = query
+        self._last_ids = result
+        return result
+
+def normalize_email(value):
+    return value.strip().casefold()
+
+def normalize_phone(value):
+    # Only the digits matter, so "+880 1945-913729" and "8801945913729" are the same number
+    return "".join(ch for ch in value if ch.isdigit())
+
+class UniqueIndex:
+    # Maps the normalized value of one field to the ids of the records that have it.
+    # Used for O(1) uniqueness checks and lookups; older data may already hold duplicates,
+    # so a value can map to more than one id.
+
+    def __init__(self, field, normalize):
+        self.field = field
+        self.normalize = normalize
+        self.ids = {}
+        self.keys = {}
+
+    def add(self, record):
+        value = record.get(self.field)
+        if value is None:
+            return
+        key = self.normalize(str(value))
+        self.keys[record["id"]] = key
+        self.ids.setdefault(key, set()).add(record["id"])
+
+    def remove(self, record):
+        key = self.keys.pop(record["id"], None)
+        if key is None:
+            return
+        ids = self.ids[key]
+        ids.discard(record["id"])
+        if not ids:
+            del self.ids[key]
+
+    def lookup(self, value):
+        # Lowest id of a record with this value, or None
+        ids = self.ids.get(self.normalize(str(value)))
+        return min(ids) if ids else None
+
+class Aggregates:
+    # Count, amount total, per-month figures and per-group counts of a set of records,
+    # updated record by record so reading them is O(1). Amounts are summed as Decimals
+    # so adding and removing the same records never drifts.
+
+    def __init__(self, amount_field=None, date_field=None, group_field=None):
+        self.amount_field = amount_field
+        self.date_field = date_field
+        self.group_field = group_field
+        self.count = 0
+        self._total = Decimal(0)
+        # "YYYY-MM" -> [count, total]
+        self.by_month = {}
+        # blood group -> count
+        self.by_group = {}
+
+    @property
+    def total(self):
+        return float(self._total)
+
+    def month_total(self, month):
+        entry = self.by_month.get(month)
+        return float(entry[1]) if entry else 0.0
+
+    def add(self, record):
+        self._change(record, 1)
+
+    def remove(self, record):
+        self._change(record, -1)
+
+    def _change(self, record, sign):
+        amount = Decimal(0)
+        if self.amount_field:
+            amount = Decimal(str(finite_amount(record.get(self.amount_field)))) * sign
+        month = str(record.get(self.date_field) or "")[:7] if self.date_field else None
+        group = record.get(self.group_field) or "" if self.group_field else None
+        self.add_bucket(sign, amount, month, group)
+
+    def add_bucket(self, count, total, month=None, group=None):
+        # Adds count records sharing a month and group whose amounts sum to total
+        self.count += count
+        self._total += total
+        if month is not None:
+            entry = self.by_month.setdefault(month, [0, Decimal(0)])
+            entry[0] += count
+            entry[1] += total
+            if entry[0] == 0:
+                del self.by_month[month]
+        if group is not None:
+            group = normalize_blood_group(group)
+            group_count = self.by_group.get(group, 0) + count
+            if group_count:
+                self.by_group[group] = group_count
+            else:
+                self.by_group.pop(group, None)
+
+def finite_amount(value):
+    # value as a float, or 0.0 when it is not a finite number. Files written before amounts
+    # were checked may hold "inf" or "nan", which would make totals NaN for good.
+    try:
+        amount = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return amount if math.isfinite(amount) else 0.0
+
+def normalize_blood_group(value):
+    # "o +" and "O+" are the same group
+    return "".join(str(value).split()).upper()
+
+class DateIndex:
+    # Records of one entity sorted by a "YYYY-MM-DD" date field, for range queries in
+    # O(log n + k). Dates, ids and (optionally) amounts are kept in parallel sorted arrays;
+    # records with the same date are ordered by id.
+
+    def __init__(self, date_field, amount_field=None):
+        self.date_field = date_field
+        self.amount_field = amount_field
+        self.dates = []
+        self.ids = array("q")
+        self.amounts = array("d")
+
+    def _position(self, date, record_id):
+        lo = bisect_left(self.dates, date)
+        hi = bisect_right(self.dates, date, lo)
+        return bisect_left(self.ids, record_id, lo, hi)
+
+    def _date(self, record):
+        return str(record.get(self.date_field) or "")
+
+    def add(self, record):
+        date = self._date(record)
+        position = self._position(date, record["id"])
+        self.dates.insert(position, date)
+        self.ids.insert(position, record["id"])
+        if self.amount_field:
+            self.amounts.insert(position, finite_amount(record.get(self.amount_field)))
+
+    def remove(self, record):
+        position = self._position(self._date(record), record["id"])
+        if position < len(self.ids) and self.ids[position] == record["id"]:
+            del self.dates[position]
+            del self.ids[position]
+            if self.amount_field:
+                del self.amounts[position]
+
+    def range(self, date_from=None, date_to=None):
+        # Positions lo:hi of the records dated date_from to date_to, both inclusive.
+        # Records without a date are never in a range.
+        lo = bisect_left(self.dates, date_from) if date_from else bisect_right(self.dates, "")
+        hi = bisect_right(self.dates, date_to) if date_to else len(self.dates)
+        return lo, max(lo, hi)
+
+    def search(self, date_from=None, date_to=None):
+        # Ids of the records in the range, in date order
+        lo, hi = self.range(date_from, date_to)
+        return self.ids[lo:hi].tolist()
+
+    def total(self, date_from=None, date_to=None):
+        lo, hi = self.range(date_from, date_to)
+        return math.fsum(self.amounts[lo:hi])
@@ -1,56 +1,31 @@
 import tkinter as tk
-from tkinter import messagebox, ttk, filedialog
+from tkinter import messagebox, filedialog
 import customtkinter as ctk
-from datetime import datetime
-import csv
-import os
+from datetime import date, datetime, timedelta
 import json
+import os
+import time
+from api_server import ApiServer
+from blood import BLOOD_GROUPS, normalize_donor_name
+from donors import merge_duplicates, plan_merges
+from perf import ProfileSession, recorder, timed
+from storage import open_storage, summarize
+from tasks import SearchScheduler, BackgroundTask, UiQueue
+from transfer import EXPORT_COLUMNS, TransferCancelled, export_csv, import_file, validate_record
+from widgets import VirtualTreeview
 
-# Set appearance
-ctk.set_appearance_mode("System")  # Can be "System", "Dark", or "Light"
-ctk.set_default_color_theme("blue")  # Themes: "blue", "green", "dark-blue"
-
-# Database file
-DATABASE_FILE = "organization_data.json"
-
-# Default data structure
-default_data = {
-    "members": [],
-    "events": [],
-    "donations": [],
-    "blood_donations": [],
-    "users": {"123456": "123456"}  # Default admin credentials
-}
-
-# Load or initialize database
-def load_database():
-    if os.path.exists(DATABASE_FILE):
-        try:
-            with open(DATABASE_FILE, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return default_data
-    return default_data
-
-def save_database(data):
-    try:
-        with open(DATABASE_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-        return True
-    except IOError:
-        return False
-
-# Global database
-db = load_database()
-members = db["members"]
-events = db["events"]
-donations = db["donations"]
-blood_donations = db["blood_donations"]
-users = db["users"]
+def setup_appearance():
+    ctk.set_appearance_mode("System")  # Can be "System", "Dark", or "Light"
+    ctk.set_default_color_theme("blue")  # Themes: "blue", "green", "dark-blue"
 
 class OrganizationApp:
-    def __init__(self, root):
+    def __init__(self, root, store):
         self.root = root
+        self.store = store
+        started = time.perf_counter()
+        self.search_scheduler = SearchScheduler(
+            root, on_error=lambda e: self.update_status(f"Search failed: {str(e)}", error=True)
+        )
         self.root.title("Organization Database Management System")
         self.root.geometry("1200x800")
         
@@ -60,27 +35,42 @@ class OrganizationApp:
         
         # File menu
         file_menu = tk.Menu(self.menu_bar, tearoff=0)
+        file_menu.add_command(label="Import Data", command=self.import_data)
         file_menu.add_command(label="Export Data", command=self.export_data)
         file_menu.add_command(label="Backup Data", command=self.backup_data)
+        file_menu.add_command(label="Merge Duplicate Donors", command=self.merge_duplicate_donors)
+        file_menu.add_separator()
+        file_menu.add_command(label="Start Profiling", command=self.toggle_profiling)
+        self.file_menu = file_menu
+        self.profile_menu_index = file_menu.index("end")
+        self.profile_session = None
+        file_menu.add_command(label="Start API Server", command=self.toggle_api_server)
+        self.api_menu_index = file_menu.index("end")
+        self.api_server = None
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         self.menu_bar.add_cascade(label="File", menu=file_menu)
         
+        # Help menu
+        help_menu = tk.Menu(self.menu_bar, tearoff=0)
+        help_menu.add_command(label="Performance", command=self.show_performance)
+        self.menu_bar.add_cascade(label="Help", menu=help_menu)
+        
         # Create tab view
-        self.tabview = ctk.CTkTabview(root)
+        self.tabview = ctk.CTkTabview(root, command=self.on_tab_change)
         self.tabview.pack(padx=20, pady=20, fill="both", expand=True)
         
-        # Add tabs
-        self.tabview.add("Members")
-        self.tabview.add("Events")
-        self.tabview.add("Donations")
-        self.tabview.add("Blood Donations")
-        
-        # Configure each tab
-        self.setup_members_tab()
-        self.setup_events_tab()
-        self.setup_donations_tab()
-        self.setup_blood_donations_tab()
+        # Add tabs; each one is built and filled the first time it is shown
+        self.tab_builders = {
+            "Members": self.setup_members_tab,
+            "Events": self.setup_events_tab,
+            "Donations": self.setup_donations_tab,
+            "Blood Donations": self.setup_blood_donations_tab,
+        }
+        self.built_tabs = set()
+        for name in self.tab_builders:
+            self.tabview.add(name)
+        self.build_tab(self.tabview.get())
         
         # Status bar
         self.status_var = ctk.StringVar()
@@ -88,22 +78,72 @@ class OrganizationApp:
         self.status_bar = ctk.CTkLabel(root, textvariable=self.status_var, anchor="w")
         self.status_bar.pack(side="bottom", fill="x", padx=10, pady=5)
         
+        # Shown while an import or export runs in the background
+        self.transfer_task = None
+        self.transfer_cancel_button = ctk.CTkButton(root, text="Cancel", width=120, command=self.cancel_transfer)
+        
+        # Saves run on a background writer that reports back through the UI queue
+        self.ui_queue = UiQueue(root)
+        self.writer = self.store.start_writer(on_saved=lambda saved: self.ui_queue.call(self.on_saved, saved))
+        
         # Auto-save timer
         self.auto_save()
+        
+        # Picks up changes made by other app windows on the same database
+        self.root.after(self.SYNC_INTERVAL, self.sync_changes)
+        
+        # Time until the window can take input, shown once it is idle
+        self.startup_seconds = None
+        self.root.after_idle(lambda: self.on_ready(started))
+    
+    def on_ready(self, started):
+        self.startup_seconds = time.perf_counter() - started
+        self.update_status(f"Ready in {self.startup_seconds:.2f} s")
+    
+    def build_tab(self, name):
+        if name not in self.built_tabs:
+            self.built_tabs.add(name)
+            self.tab_builders[name]()
+    
+    def on_tab_change(self):
+        self.build_tab(self.tabview.get())
     
     def auto_save(self):
-        self.save_data()
+        # Only rewrite the database when it has changes that are not in it yet
+        if self.store.needs_checkpoint():
+            self.save_data()
         self.root.after(300000, self.auto_save)  # Auto-save every 5 minutes
     
-    def save_data(self):
-        db = {
-            "members": members,
-            "events": events,
-            "donations": donations,
-            "blood_donations": blood_donations,
-            "users": users
+    # Milliseconds between checks for changes made by other processes
+    SYNC_INTERVAL = 2000
+    
+    def sync_changes(self):
+        # Reruns the search of every open tab whose data another process changed
+        views = {
+            "members": ("Members", self.search_members),
+            "events": ("Events", self.search_events),
+            "donations": ("Donations", self.search_donations),
+            "blood_donations": ("Blood Donations", self.search_blood_donations),
         }
-        if save_database(db):
+        try:
+            changed = self.store.sync()
+        except OSError:
+            changed = set()
+        for entity in sorted(changed):
+            tab, search = views[entity]
+            if tab in self.built_tabs:
+                search()
+        self.root.after(self.SYNC_INTERVAL, self.sync_changes)
+    
+    @timed("save_data")
+    def save_data(self):
+        if self.writer:
+            self.writer.mark_dirty()
+        else:
+            self.on_saved(self.store.checkpoint())
+    
+    def on_saved(self, saved):
+        if saved:
             self.update_status("Data saved successfully")
         else:
             self.update_status("Error saving data", error=True)
@@ -115,27 +155,109 @@ class OrganizationApp:
             title="Save backup file"
         )
         if backup_file:
-            db = {
-                "members": members,
-                "events": events,
-                "donations": donations,
-                "blood_donations": blood_donations,
-                "users": users
-            }
             try:
                 with open(backup_file, "w") as f:
-                    json.dump(db, f, indent=2)
+                    json.dump(self.store.export_data(), f, indent=2)
                 self.update_status(f"Backup saved to {backup_file}")
             except IOError:
                 self.update_status("Error saving backup", error=True)
     
+    def import_data(self):
+        if self.transfer_running():
+            return
+        # Ask which data the file holds
+        import_type = tk.StringVar(value="blood_donations")
+        
+        import_dialog = ctk.CTkToplevel(self.root)
+        import_dialog.title("Import Data")
+        import_dialog.geometry("400x300")
+        import_dialog.transient(self.root)
+        import_dialog.grab_set()
+        
+        ctk.CTkLabel(import_dialog, text="Select data to import:", font=("Arial", 14)).pack(pady=10)
+        
+        options = [
+            ("Members", "members"),
+            ("Events", "events"),
+            ("Donations", "donations"),
+            ("Blood Donations", "blood_donations")
+        ]
+        
+        for text, value in options:
+            ctk.CTkRadioButton(import_dialog, text=text, variable=import_type, value=value).pack(anchor="w", padx=20, pady=5)
+        
+        def choose_file():
+            data_type = import_type.get()
+            filename = filedialog.askopenfilename(
+                filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json"), ("All files", "*.*")],
+                title=f"Import {data_type} from CSV or JSON"
+            )
+            if filename:
+                import_dialog.destroy()
+                self.start_import(data_type, filename)
+        
+        ctk.CTkButton(import_dialog, text="Choose File", command=choose_file).pack(pady=20)
+    
+    def start_import(self, data_type, filename, skip_invalid=False):
+        # The file is validated and stored on a worker thread; the tab is refreshed once at the end
+        label = data_type.replace("_", " ").capitalize()
+        refresh = {
+            "members": self.refresh_members,
+            "events": self.refresh_events,
+            "donations": self.refresh_donations,
+            "blood_donations": self.refresh_blood_donations,
+        }[data_type]
+        
+        def work(progress, cancelled):
+            return import_file(self.store, data_type, filename, skip_invalid, progress, cancelled)
+        
+        def on_progress(count):
+            self.status_var.set(f"Importing {label}: {count:,} rows checked")
+            self.status_bar.configure(text_color="gray")
+        
+        def on_done(result):
+            self.transfer_cancel_button.pack_forget()
+            if result.imported:
+                refresh()
+            if result.invalid and not skip_invalid:
+                # Nothing was stored; show what is wrong and offer to import the valid rows only
+                lines = [f"Row {row}: {message}" for row, message in result.errors[:20]]
+                if result.invalid > len(lines):
+                    lines.append(f"... and {result.invalid - len(lines):,} more")
+                valid = result.checked - result.invalid
+                self.update_status(f"Import of {label} found {result.invalid:,} invalid rows", error=True)
+                if valid and messagebox.askyesno(
+                        "Import Errors",
+                        "\n".join(lines) + f"\n\nImport the {valid:,} valid rows and skip the invalid ones?"):
+                    self.start_import(data_type, filename, skip_invalid=True)
+                elif not valid:
+                    messagebox.showerror("Import Errors", "\n".join(lines))
+                return
+            message = f"Imported {result.imported:,} {label.lower()} records"
+            if result.invalid:
+                message += f", skipped {result.invalid:,} invalid rows"
+            self.update_status(message)
+        
+        def on_error(error):
+            self.transfer_cancel_button.pack_forget()
+            if isinstance(error, TransferCancelled):
+                self.update_status("Import cancelled")
+            else:
+                self.update_status(f"Import failed: {str(error)}", error=True)
+        
+        self.status_var.set(f"Importing {label}...")
+        self.transfer_cancel_button.pack(side="bottom", anchor="e", padx=10, before=self.status_bar)
+        self.transfer_task = BackgroundTask(self.root, work, on_done, on_progress, on_error)
+    
     def export_data(self):
+        if self.transfer_running():
+            return
         # Ask which data to export
         export_type = tk.StringVar(value="members")
         
         export_dialog = ctk.CTkToplevel(self.root)
         export_dialog.title("Export Data")
-        export_dialog.geometry("400x300")
+        export_dialog.geometry("420x560")
         export_dialog.transient(self.root)
         export_dialog.grab_set()
         
@@ -148,43 +270,107 @@ class OrganizationApp:
             ("Blood Donations", "blood_donations")
         ]
         
+        # Columns to include, rebuilt whenever the data type changes
+        ctk.CTkLabel(export_dialog, text="Columns:").pack(anchor="w", padx=20)
+        columns_frame = ctk.CTkFrame(export_dialog)
+        column_vars = []
+        
+        def show_columns():
+            for widget in columns_frame.winfo_children():
+                widget.destroy()
+            column_vars.clear()
+            for column in EXPORT_COLUMNS[export_type.get()]:
+                var = tk.BooleanVar(value=True)
+                ctk.CTkCheckBox(columns_frame, text=column, variable=var).pack(side="left", padx=5, pady=5)
+                column_vars.append((column, var))
+        
         for text, value in options:
-            ctk.CTkRadioButton(export_dialog, text=text, variable=export_type, value=value).pack(anchor="w", padx=20, pady=5)
+            ctk.CTkRadioButton(export_dialog, text=text, variable=export_type, value=value,
+                               command=show_columns).pack(anchor="w", padx=20, pady=5)
+        columns_frame.pack(fill="x", padx=20, pady=5)
+        show_columns()
+        
+        # Filters
+        filters_frame = ctk.CTkFrame(export_dialog)
+        filters_frame.pack(fill="x", padx=20, pady=10)
+        filter_entries = {}
+        for row, (label, key) in enumerate([("From (YYYY-MM-DD)", "date_from"),
+                                            ("To (YYYY-MM-DD)", "date_to"),
+                                            ("Blood Group", "blood_group")]):
+            ctk.CTkLabel(filters_frame, text=label).grid(row=row, column=0, padx=5, pady=5, sticky="w")
+            entry = ctk.CTkEntry(filters_frame, width=150)
+            entry.grid(row=row, column=1, padx=5, pady=5, sticky="w")
+            filter_entries[key] = entry
+        ctk.CTkLabel(filters_frame, text="Dates apply to events and donations, blood group to blood donations.",
+                     wraplength=360).grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         
         def perform_export():
             data_type = export_type.get()
+            columns = [column for column, var in column_vars if var.get()]
+            if not columns:
+                messagebox.showerror("Error", "Select at least one column")
+                return
+            filters = {key: entry.get().strip() or None for key, entry in filter_entries.items()}
+            for key in ("date_from", "date_to"):
+                if filters[key]:
+                    try:
+                        datetime.strptime(filters[key], "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+                        return
             filename = filedialog.asksaveasfilename(
                 defaultextension=".csv",
                 filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
                 title=f"Export {data_type} to CSV"
             )
             if filename:
-                try:
-                    if data_type == "members":
-                        data = members
-                        fieldnames = ["id", "name", "email", "phone", "address"]
-                    elif data_type == "events":
-                        data = events
-                        fieldnames = ["id", "name", "date", "location", "description"]
-                    elif data_type == "donations":
-                        data = donations
-                        fieldnames = ["id", "donor_name", "amount", "date"]
-                    elif data_type == "blood_donations":
-                        data = blood_donations
-                        fieldnames = ["id", "donor_name", "blood_group", "donation_date"]
-                    
-                    with open(filename, "w", newline="") as csvfile:
-                        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                        writer.writeheader()
-                        writer.writerows(data)
-                    
-                    self.update_status(f"{data_type.capitalize()} exported to {filename}")
-                    export_dialog.destroy()
-                except Exception as e:
-                    self.update_status(f"Export failed: {str(e)}", error=True)
+                export_dialog.destroy()
+                self.start_export(data_type, filename, columns, filters)
         
         ctk.CTkButton(export_dialog, text="Export", command=perform_export).pack(pady=20)
     
+    def start_export(self, data_type, filename, columns, filters):
+        # The CSV is written on a worker thread; the status bar shows progress until it finishes
+        label = data_type.replace("_", " ").capitalize()
+        
+        def work(progress, cancelled):
+            return export_csv(self.store, data_type, filename, columns, progress=progress,
+                              cancelled=cancelled, **filters)
+        
+        def on_progress(count, total):
+            if total:
+                self.status_var.set(f"Exporting {label}: {count:,} of {total:,} rows")
+            else:
+                self.status_var.set(f"Exporting {label}: {count:,} rows")
+            self.status_bar.configure(text_color="gray")
+        
+        def on_done(count):
+            self.transfer_cancel_button.pack_forget()
+            self.update_status(f"{label} exported to {filename} ({count:,} rows)")
+        
+        def on_error(error):
+            self.transfer_cancel_button.pack_forget()
+            if isinstance(error, TransferCancelled):
+                self.update_status("Export cancelled")
+            else:
+                self.update_status(f"Export failed: {str(error)}", error=True)
+        
+        self.status_var.set(f"Exporting {label}...")
+        self.transfer_cancel_button.pack(side="bottom", anchor="e", padx=10, before=self.status_bar)
+        self.transfer_task = BackgroundTask(self.root, work, on_done, on_progress, on_error)
+    
+    def transfer_running(self):
+        # Only one import or export runs at a time
+        if self.transfer_task and not self.transfer_task.finished:
+            messagebox.showinfo("Busy", "An import or export is already running.")
+            return True
+        return False
+    
+    def cancel_transfer(self):
+        if self.transfer_task:
+            self.transfer_task.cancel()
+            self.status_var.set("Cancelling...")
+    
     def update_status(self, message, error=False):
         self.status_var.set(message)
         if error:
@@ -241,22 +427,11 @@ class OrganizationApp:
         
         # Treeview for members
         columns = ("ID", "Name", "Email", "Phone", "Address")
-        self.member_tree = ttk.Treeview(view_frame, columns=columns, show="headings", selectmode="browse")
-        
-        for col in columns:
-            self.member_tree.heading(col, text=col)
-            self.member_tree.column(col, width=100, anchor="w")
-        
-        self.member_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.member_tree = VirtualTreeview(view_frame, columns, self.member_row)
         
         # Bind treeview selection
         self.member_tree.bind("<<TreeviewSelect>>", self.on_member_select)
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(view_frame, orient="vertical", command=self.member_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.member_tree.configure(yscrollcommand=scrollbar.set)
-        
         # Button frame
         del_button_frame = ctk.CTkFrame(tab)
         del_button_frame.pack(pady=5)
@@ -279,6 +454,8 @@ class OrganizationApp:
         self.event_search_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.event_search_entry.bind("<KeyRelease>", lambda e: self.search_events())
         
+        self.event_date_entries = self.add_date_filter(search_frame, self.search_events)
+        
         ctk.CTkButton(search_frame, text="Clear", width=80, command=self.clear_event_search).pack(side="left", padx=5)
         
         # Add/edit event frame
@@ -312,22 +489,11 @@ class OrganizationApp:
         
         # Treeview for events
         columns = ("ID", "Name", "Date", "Location", "Description")
-        self.event_tree = ttk.Treeview(view_frame, columns=columns, show="headings", selectmode="browse")
-        
-        for col in columns:
-            self.event_tree.heading(col, text=col)
-            self.event_tree.column(col, width=100, anchor="w")
-        
-        self.event_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.event_tree = VirtualTreeview(view_frame, columns, self.event_row)
         
         # Bind treeview selection
         self.event_tree.bind("<<TreeviewSelect>>", self.on_event_select)
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(view_frame, orient="vertical", command=self.event_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.event_tree.configure(yscrollcommand=scrollbar.set)
-        
         # Button frame
         button_frame = ctk.CTkFrame(tab)
         button_frame.pack(pady=5)
@@ -350,6 +516,8 @@ class OrganizationApp:
         self.donation_search_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.donation_search_entry.bind("<KeyRelease>", lambda e: self.search_donations())
         
+        self.donation_date_entries = self.add_date_filter(search_frame, self.search_donations)
+        
         ctk.CTkButton(search_frame, text="Clear", width=80, command=self.clear_donation_search).pack(side="left", padx=5)
         
         # Add/edit donation frame
@@ -383,22 +551,11 @@ class OrganizationApp:
         
         # Treeview for donations
         columns = ("ID", "Donor Name", "Amount", "Date")
-        self.donation_tree = ttk.Treeview(view_frame, columns=columns, show="headings", selectmode="browse")
-        
-        for col in columns:
-            self.donation_tree.heading(col, text=col)
-            self.donation_tree.column(col, width=100, anchor="w")
-        
-        self.donation_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.donation_tree = VirtualTreeview(view_frame, columns, self.donation_row)
         
         # Bind treeview selection
         self.donation_tree.bind("<<TreeviewSelect>>", self.on_donation_select)
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(view_frame, orient="vertical", command=self.donation_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.donation_tree.configure(yscrollcommand=scrollbar.set)
-        
         # Summary frame
         summary_frame = ctk.CTkFrame(tab)
         summary_frame.pack(pady=5, padx=10, fill="x")
@@ -413,6 +570,8 @@ class OrganizationApp:
         ctk.CTkButton(button_frame, text="Delete Selected", command=self.delete_donation, 
                       fg_color="#d9534f", hover_color="#c9302c").pack(side="left", padx=5)
         ctk.CTkButton(button_frame, text="Refresh List", command=self.refresh_donations).pack(side="left", padx=5)
+        ctk.CTkButton(button_frame, text="Donor History",
+                      command=lambda: self.show_donor_history(self.donation_entries["donor"].get())).pack(side="left", padx=5)
         
         # Load initial data
         self.refresh_donations()
@@ -429,6 +588,8 @@ class OrganizationApp:
         self.blood_donation_search_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.blood_donation_search_entry.bind("<KeyRelease>", lambda e: self.search_blood_donations())
         
+        self.blood_donation_date_entries = self.add_date_filter(search_frame, self.search_blood_donations)
+        
         ctk.CTkButton(search_frame, text="Clear", width=80, command=self.clear_blood_donation_search).pack(side="left", padx=5)
         
         # Add/edit blood donation frame
@@ -462,22 +623,11 @@ class OrganizationApp:
         
         # Treeview for blood donations
         columns = ("ID", "Donor Name", "Blood Group", "Donation Date")
-        self.blood_donation_tree = ttk.Treeview(view_frame, columns=columns, show="headings", selectmode="browse")
-        
-        for col in columns:
-            self.blood_donation_tree.heading(col, text=col)
-            self.blood_donation_tree.column(col, width=100, anchor="w")
-        
-        self.blood_donation_tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.blood_donation_tree = VirtualTreeview(view_frame, columns, self.blood_donation_row)
         
         # Bind treeview selection
         self.blood_donation_tree.bind("<<TreeviewSelect>>", self.on_blood_donation_select)
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(view_frame, orient="vertical", command=self.blood_donation_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.blood_donation_tree.configure(yscrollcommand=scrollbar.set)
-        
         # Summary frame
         summary_frame = ctk.CTkFrame(tab)
         summary_frame.pack(pady=5, padx=10, fill="x")
@@ -492,10 +642,255 @@ class OrganizationApp:
         ctk.CTkButton(button_frame, text="Delete Selected", command=self.delete_blood_donation, 
                       fg_color="#d9534f", hover_color="#c9302c").pack(side="left", padx=5)
         ctk.CTkButton(button_frame, text="Refresh List", command=self.refresh_blood_donations).pack(side="left", padx=5)
+        ctk.CTkButton(button_frame, text="Eligible Donors", command=self.show_eligible_donors).pack(side="left", padx=5)
+        ctk.CTkButton(button_frame, text="Donor History",
+                      command=lambda: self.show_donor_history(self.blood_donation_entries["donor"].get())).pack(side="left", padx=5)
         
         # Load initial data
         self.refresh_blood_donations()
     
+    # Compatible donors listed for a recipient, most recent donors first
+    RECIPIENT_MATCH_LIMIT = 100
+    
+    def show_eligible_donors(self):
+        # Donors of one blood group who may donate on a given day, those eligible longest first,
+        # or with "For recipient" checked the donors whose blood the group can receive
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.title("Eligible Donors")
+        dialog.geometry("820x500")
+        dialog.transient(self.root)
+        
+        controls = ctk.CTkFrame(dialog)
+        controls.pack(fill="x", padx=10, pady=10)
+        ctk.CTkLabel(controls, text="Blood Group:").pack(side="left", padx=5)
+        group_menu = ctk.CTkOptionMenu(controls, values=list(BLOOD_GROUPS), width=80)
+        group_menu.set("O-")
+        group_menu.pack(side="left", padx=5)
+        ctk.CTkLabel(controls, text="Date:").pack(side="left", padx=5)
+        date_entry = ctk.CTkEntry(controls, width=100)
+        date_entry.insert(0, date.today().isoformat())
+        date_entry.pack(side="left", padx=5)
+        # Days a donor waits between donations, for this session
+        ctk.CTkLabel(controls, text="Deferral (days):").pack(side="left", padx=5)
+        deferral_entry = ctk.CTkEntry(controls, width=50)
+        deferral_entry.insert(0, str(self.store.deferral_days))
+        deferral_entry.pack(side="left", padx=5)
+        recipient_var = tk.BooleanVar(value=False)
+        
+        summary_var = ctk.StringVar()
+        ctk.CTkLabel(dialog, textvariable=summary_var, anchor="w").pack(fill="x", padx=15)
+        
+        view_frame = ctk.CTkFrame(dialog)
+        view_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        columns = ("Donor Name", "Blood Group", "Last Donation", "Eligible From", "Donations")
+        tree = VirtualTreeview(view_frame, columns, self.donor_status_row,
+                               key=lambda status: normalize_donor_name(status.name))
+        
+        def find():
+            day = date_entry.get().strip()
+            try:
+                datetime.strptime(day, "%Y-%m-%d")
+            except ValueError:
+                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD", parent=dialog)
+                return
+            try:
+                deferral = int(deferral_entry.get().strip())
+            except ValueError:
+                deferral = -1
+            if deferral < 0:
+                messagebox.showerror("Error", "Deferral must be a whole number of days", parent=dialog)
+                return
+            if deferral != self.store.deferral_days:
+                self.store.set_deferral(deferral)
+            if recipient_var.get():
+                donors = self.store.compatible_donors(group_menu.get(), day, self.RECIPIENT_MATCH_LIMIT)
+                tree.set_rows(donors)
+                summary_var.set(f"{len(donors)} donors compatible with a {group_menu.get()} recipient, "
+                                f"eligible on {day}, most recent donors first (deferral {deferral} days)")
+                return
+            donors = self.store.eligible_donors(group_menu.get(), day)
+            tree.set_rows(donors)
+            summary_var.set(f"{len(donors)} {group_menu.get()} donors eligible on {day} "
+                            f"(deferral {deferral} days)")
+        
+        group_menu.configure(command=lambda value: find())
+        date_entry.bind("<Return>", lambda e: find())
+        deferral_entry.bind("<Return>", lambda e: find())
+        ctk.CTkCheckBox(controls, text="For recipient", variable=recipient_var,
+                        command=find).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Find", width=80, command=find).pack(side="left", padx=5)
+        find()
+    
+    def show_donor_history(self, name):
+        # Every donation and blood donation by one donor, and the member the donor is linked to
+        name = name.strip()
+        if not name:
+            messagebox.showerror("Error", "Please select a donation or enter a donor name")
+            return
+        history = self.store.donor_history(name)
+        member = self.store.donor_member(name)
+        
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.title(f"Donor History - {name}")
+        dialog.geometry("600x450")
+        dialog.transient(self.root)
+        
+        if member:
+            linked = f"Member #{member['id']}: {member['name']} ({member['email']}, {member['phone']})"
+        else:
+            linked = "Not linked to a member"
+        ctk.CTkLabel(dialog, text=linked, anchor="w").pack(fill="x", padx=15, pady=(10, 0))
+        total = sum(record["amount"] for entity, record in history if entity == "donations")
+        blood = sum(1 for entity, record in history if entity == "blood_donations")
+        ctk.CTkLabel(dialog, text=f"{len(history) - blood} donations (${total:,.2f}), {blood} blood donations",
+                     anchor="w").pack(fill="x", padx=15)
+        
+        view_frame = ctk.CTkFrame(dialog)
+        view_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        # Donations and blood donations have ids of their own, so the type is part of the key
+        tree = VirtualTreeview(view_frame, ("Type", "ID", "Date", "Details"), self.donor_history_row,
+                               key=lambda item: f"{item[0]}:{item[1]['id']}")
+        tree.set_rows(history)
+    
+    def merge_duplicate_donors(self):
+        # Finds donor names that look like the same person on a worker thread and, once
+        # confirmed, renames their donations to one name
+        if self.transfer_running():
+            return
+        
+        def work(progress, cancelled):
+            return plan_merges(self.store)
+        
+        def on_done(groups):
+            if not groups:
+                self.update_status("No duplicate donors found")
+                return
+            lines = [f"{', '.join(group.names)} -> {group.canonical} ({group.count()} records)"
+                     for group in groups[:15]]
+            if len(groups) > len(lines):
+                lines.append(f"... and {len(groups) - len(lines):,} more")
+            records = sum(group.count() for group in groups)
+            if messagebox.askyesno("Merge Duplicate Donors",
+                                   "\n".join(lines) + f"\n\nRename the donor of {records:,} records?"):
+                def merge(progress, cancelled):
+                    return merge_duplicates(self.store, groups)
+                
+                self.status_var.set("Merging duplicate donors...")
+                self.transfer_task = BackgroundTask(self.root, merge, on_merged, on_error=on_error)
+            else:
+                self.update_status("Ready")
+        
+        def on_merged(count):
+            self.refresh_donations()
+            self.refresh_blood_donations()
+            self.update_status(f"Merged duplicate donors in {count:,} records")
+        
+        def on_error(error):
+            self.update_status(f"Merging duplicate donors failed: {str(error)}", error=True)
+        
+        self.status_var.set("Looking for duplicate donors...")
+        self.transfer_task = BackgroundTask(self.root, work, on_done, on_error=on_error)
+    
+    def toggle_profiling(self):
+        # Records cProfile and tracemalloc data until chosen again, then saves the reports
+        if self.profile_session is None:
+            self.profile_session = ProfileSession()
+            self.profile_session.start()
+            self.file_menu.entryconfigure(self.profile_menu_index, label="Stop Profiling")
+            self.update_status("Profiling... choose File > Stop Profiling when done")
+            return
+        
+        session = self.profile_session
+        self.profile_session = None
+        session.stop()
+        self.file_menu.entryconfigure(self.profile_menu_index, label="Start Profiling")
+        self.status_var.set("Saving profile...")
+        
+        def on_done(files):
+            self.update_status(f"Profile saved to {os.path.abspath(files[0])}")
+            messagebox.showinfo("Profiling", "Profile saved:\n\n" + "\n".join(os.path.abspath(f) for f in files))
+        
+        def on_error(error):
+            self.update_status(f"Saving profile failed: {str(error)}", error=True)
+        
+        BackgroundTask(self.root, lambda progress, cancelled: session.save(), on_done, on_error=on_error)
+    
+    def toggle_api_server(self):
+        # Serves the data read-only over HTTP on this machine until chosen again
+        if self.api_server is None:
+            server = ApiServer(self.store)
+            try:
+                server.start()
+            except OSError as e:
+                self.update_status(f"Starting the API server failed: {str(e)}", error=True)
+                return
+            self.api_server = server
+            self.file_menu.entryconfigure(self.api_menu_index, label="Stop API Server")
+            self.update_status(f"API server running at {server.url}")
+            return
+        
+        self.api_server.stop()
+        self.api_server = None
+        self.file_menu.entryconfigure(self.api_menu_index, label="Start API Server")
+        self.update_status("API server stopped")
+    
+    def show_performance(self):
+        # Timings of the hot paths recorded by perf; refreshed every second while open
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.title("Performance")
+        dialog.geometry("800x450")
+        dialog.transient(self.root)
+        
+        controls = ctk.CTkFrame(dialog)
+        controls.pack(fill="x", padx=10, pady=10)
+        recording_var = tk.BooleanVar(value=recorder.enabled)
+        
+        def set_recording():
+            recorder.enabled = bool(recording_var.get())
+        
+        ctk.CTkCheckBox(controls, text="Record timings", variable=recording_var,
+                        command=set_recording).pack(side="left", padx=5)
+        
+        view_frame = ctk.CTkFrame(dialog)
+        view_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        columns = ("Name", "Calls", "Rows", "p50 ms", "p95 ms", "Max ms", "Total ms")
+        tree = VirtualTreeview(view_frame, columns, self.perf_row)
+        
+        def update():
+            tree.set_rows(recorder.summary())
+        
+        def poll():
+            if dialog.winfo_exists():
+                update()
+                dialog.after(1000, poll)
+        
+        def reset():
+            recorder.reset()
+            update()
+        
+        def export(kind):
+            filename = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+                title="Export performance trace" if kind == "trace" else "Export performance stats"
+            )
+            if not filename:
+                return
+            try:
+                if kind == "trace":
+                    recorder.export_trace(filename)
+                else:
+                    recorder.export_json(filename)
+                self.update_status(f"Performance data exported to {filename}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to export: {str(e)}", parent=dialog)
+        
+        ctk.CTkButton(controls, text="Reset", width=80, command=reset).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Export Stats", width=100, command=lambda: export("stats")).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Export Trace", width=100, command=lambda: export("trace")).pack(side="left", padx=5)
+        update()
+        dialog.after(1000, poll)
+    
     # Database operations
     def add_member(self):
         try:
@@ -505,31 +900,29 @@ class OrganizationApp:
             address = self.member_entries["address"].get()
             password = self.member_entries["password"].get()
             
-            if not all([name, email, phone, address, password]):
-                messagebox.showerror("Error", "All fields are required!")
+            try:
+                record = validate_record("members", {
+                    "name": name,
+                    "email": email,
+                    "phone": phone,
+                    "address": address,
+                    "password": password
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
             # Check if email already exists
-            if any(member["email"] == email for member in members):
+            if self.store.find_by("members", "email", record["email"]):
                 messagebox.showerror("Error", "Email already exists!")
                 return
             
-            member_id = max([member["id"] for member in members], default=0) + 1
-            member = {
-                "id": member_id,
-                "name": name,
-                "email": email,
-                "phone": phone,
-                "address": address,
-                "password": password
-            }
-            members.append(member)
+            self.store.insert("members", record)
             
             # Clear entries
             self.clear_member_fields()
             
             self.refresh_members()
-            self.save_data()
             self.update_status(f"Member '{name}' added successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -550,27 +943,32 @@ class OrganizationApp:
             address = self.member_entries["address"].get()
             password = self.member_entries["password"].get()
             
-            if not all([name, email, phone, address, password]):
-                messagebox.showerror("Error", "All fields are required!")
+            try:
+                record = validate_record("members", {
+                    "name": name,
+                    "email": email,
+                    "phone": phone,
+                    "address": address,
+                    "password": password
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Find and update member
-            for member in members:
-                if member["id"] == member_id:
-                    # Check if email is being changed to one that already exists
-                    if member["email"] != email and any(m["email"] == email for m in members):
-                        messagebox.showerror("Error", "Email already exists!")
-                        return
-                    
-                    member["name"] = name
-                    member["email"] = email
-                    member["phone"] = phone
-                    member["address"] = address
-                    member["password"] = password
-                    break
+            # Check if email is being changed to one that already exists
+            existing = self.store.find_by("members", "email", record["email"])
+            if existing and existing["id"] != member_id:
+                messagebox.showerror("Error", "Email already exists!")
+                return
+            
+            if self.store.update("members", member_id, record) is None:
+                # Another app window deleted it since the list was shown
+                self.member_tree.clear_selection()
+                self.refresh_members()
+                messagebox.showerror("Error", "This member no longer exists; it was deleted in another window")
+                return
             
             self.refresh_members()
-            self.save_data()
             self.update_status(f"Member '{name}' updated successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -587,11 +985,14 @@ class OrganizationApp:
         
         confirm = messagebox.askyesno("Confirm", f"Are you sure you want to delete {member_name}?")
         if confirm:
-            global members
-            members = [member for member in members if member["id"] != member_id]
+            try:
+                self.store.delete("members", member_id)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            self.member_tree.clear_selection()
             self.clear_member_fields()
             self.refresh_members()
-            self.save_data()
             self.update_status(f"Member '{member_name}' deleted successfully.")
     
     def add_event(self):
@@ -601,32 +1002,24 @@ class OrganizationApp:
             location = self.event_entries["location"].get()
             description = self.event_entries["description"].get()
             
-            if not all([name, date_str, location]):
-                messagebox.showerror("Error", "Name, Date, and Location are required!")
-                return
-            
-            # Validate date format
+            # Required fields and date format
             try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+                record = validate_record("events", {
+                    "name": name,
+                    "date": date_str,
+                    "location": location,
+                    "description": description
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            event_id = max([event["id"] for event in events], default=0) + 1
-            event = {
-                "id": event_id,
-                "name": name,
-                "date": date_str,
-                "location": location,
-                "description": description
-            }
-            events.append(event)
+            self.store.insert("events", record)
             
             # Clear entries
             self.clear_event_fields()
             
             self.refresh_events()
-            self.save_data()
             self.update_status(f"Event '{name}' added successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -646,28 +1039,26 @@ class OrganizationApp:
             location = self.event_entries["location"].get()
             description = self.event_entries["description"].get()
             
-            if not all([name, date_str, location]):
-                messagebox.showerror("Error", "Name, Date, and Location are required!")
-                return
-            
-            # Validate date format
+            # Required fields and date format
             try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+                record = validate_record("events", {
+                    "name": name,
+                    "date": date_str,
+                    "location": location,
+                    "description": description
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Find and update event
-            for event in events:
-                if event["id"] == event_id:
-                    event["name"] = name
-                    event["date"] = date_str
-                    event["location"] = location
-                    event["description"] = description
-                    break
+            if self.store.update("events", event_id, record) is None:
+                # Another app window deleted it since the list was shown
+                self.event_tree.clear_selection()
+                self.refresh_events()
+                messagebox.showerror("Error", "This event no longer exists; it was deleted in another window")
+                return
             
             self.refresh_events()
-            self.save_data()
             self.update_status(f"Event '{name}' updated successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -684,11 +1075,14 @@ class OrganizationApp:
         
         confirm = messagebox.askyesno("Confirm", f"Are you sure you want to delete {event_name}?")
         if confirm:
-            global events
-            events = [event for event in events if event["id"] != event_id]
+            try:
+                self.store.delete("events", event_id)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            self.event_tree.clear_selection()
             self.clear_event_fields()
             self.refresh_events()
-            self.save_data()
             self.update_status(f"Event '{event_name}' deleted successfully.")
     
     def add_donation(self):
@@ -697,38 +1091,23 @@ class OrganizationApp:
             amount_str = self.donation_entries["amount"].get()
             date_str = self.donation_entries["date"].get()
             
-            if not all([donor_name, amount_str, date_str]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-            
-            # Validate amount
+            # Required fields, amount and date format
             try:
-                amount = float(amount_str)
-            except ValueError:
-                messagebox.showerror("Error", "Amount must be a number")
+                record = validate_record("donations", {
+                    "donor_name": donor_name,
+                    "amount": amount_str,
+                    "date": date_str
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Validate date format
-            try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
-                return
-            
-            donation_id = max([donation["id"] for donation in donations], default=0) + 1
-            donation = {
-                "id": donation_id,
-                "donor_name": donor_name,
-                "amount": amount,
-                "date": date_str
-            }
-            donations.append(donation)
+            self.store.insert("donations", record)
             
             # Clear entries
             self.clear_donation_fields()
             
             self.refresh_donations()
-            self.save_data()
             self.update_status(f"Donation from '{donor_name}' added successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -747,34 +1126,25 @@ class OrganizationApp:
             amount_str = self.donation_entries["amount"].get()
             date_str = self.donation_entries["date"].get()
             
-            if not all([donor_name, amount_str, date_str]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-            
-            # Validate amount
+            # Required fields, amount and date format
             try:
-                amount = float(amount_str)
-            except ValueError:
-                messagebox.showerror("Error", "Amount must be a number")
+                record = validate_record("donations", {
+                    "donor_name": donor_name,
+                    "amount": amount_str,
+                    "date": date_str
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Validate date format
-            try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+            if self.store.update("donations", donation_id, record) is None:
+                # Another app window deleted it since the list was shown
+                self.donation_tree.clear_selection()
+                self.refresh_donations()
+                messagebox.showerror("Error", "This donation no longer exists; it was deleted in another window")
                 return
             
-            # Find and update donation
-            for donation in donations:
-                if donation["id"] == donation_id:
-                    donation["donor_name"] = donor_name
-                    donation["amount"] = amount
-                    donation["date"] = date_str
-                    break
-            
             self.refresh_donations()
-            self.save_data()
             self.update_status(f"Donation from '{donor_name}' updated successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -791,11 +1161,14 @@ class OrganizationApp:
         
         confirm = messagebox.askyesno("Confirm", f"Are you sure you want to delete donation from {donor_name}?")
         if confirm:
-            global donations
-            donations = [donation for donation in donations if donation["id"] != donation_id]
+            try:
+                self.store.delete("donations", donation_id)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            self.donation_tree.clear_selection()
             self.clear_donation_fields()
             self.refresh_donations()
-            self.save_data()
             self.update_status(f"Donation from '{donor_name}' deleted successfully.")
     
     def add_blood_donation(self):
@@ -804,31 +1177,23 @@ class OrganizationApp:
             blood_group = self.blood_donation_entries["blood"].get()
             date_str = self.blood_donation_entries["donation"].get()
             
-            if not all([donor_name, blood_group, date_str]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-            
-            # Validate date format
+            # Required fields and date format
             try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+                record = validate_record("blood_donations", {
+                    "donor_name": donor_name,
+                    "blood_group": blood_group,
+                    "donation_date": date_str
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            blood_donation_id = max([bd["id"] for bd in blood_donations], default=0) + 1
-            blood_donation = {
-                "id": blood_donation_id,
-                "donor_name": donor_name,
-                "blood_group": blood_group,
-                "donation_date": date_str
-            }
-            blood_donations.append(blood_donation)
+            self.store.insert("blood_donations", record)
             
             # Clear entries
             self.clear_blood_donation_fields()
             
             self.refresh_blood_donations()
-            self.save_data()
             self.update_status(f"Blood donation from '{donor_name}' added successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -847,27 +1212,25 @@ class OrganizationApp:
             blood_group = self.blood_donation_entries["blood"].get()
             date_str = self.blood_donation_entries["donation"].get()
             
-            if not all([donor_name, blood_group, date_str]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-            
-            # Validate date format
+            # Required fields and date format
             try:
-                datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
+                record = validate_record("blood_donations", {
+                    "donor_name": donor_name,
+                    "blood_group": blood_group,
+                    "donation_date": date_str
+                })
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Find and update blood donation
-            for bd in blood_donations:
-                if bd["id"] == blood_donation_id:
-                    bd["donor_name"] = donor_name
-                    bd["blood_group"] = blood_group
-                    bd["donation_date"] = date_str
-                    break
+            if self.store.update("blood_donations", blood_donation_id, record) is None:
+                # Another app window deleted it since the list was shown
+                self.blood_donation_tree.clear_selection()
+                self.refresh_blood_donations()
+                messagebox.showerror("Error", "This blood donation no longer exists; it was deleted in another window")
+                return
             
             self.refresh_blood_donations()
-            self.save_data()
             self.update_status(f"Blood donation from '{donor_name}' updated successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -884,141 +1247,165 @@ class OrganizationApp:
         
         confirm = messagebox.askyesno("Confirm", f"Are you sure you want to delete blood donation from {donor_name}?")
         if confirm:
-            global blood_donations
-            blood_donations = [bd for bd in blood_donations if bd["id"] != blood_donation_id]
+            try:
+                self.store.delete("blood_donations", blood_donation_id)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            self.blood_donation_tree.clear_selection()
             self.clear_blood_donation_fields()
             self.refresh_blood_donations()
-            self.save_data()
             self.update_status(f"Blood donation from '{donor_name}' deleted successfully.")
     
     # Search functions
+    # Filtering runs on the search worker thread; the show_* functions update the treeview with the result
     def search_members(self):
         query = self.member_search_entry.get().lower()
         if not query:
+            self.search_scheduler.cancel("members")
             self.refresh_members()
             return
         
-        filtered = []
-        for member in members:
-            if (query in member["name"].lower() or 
-                query in member["email"].lower() or 
-                query in member["phone"].lower() or 
-                query in member["address"].lower()):
-                filtered.append(member)
-        
-        # Update treeview
-        for item in self.member_tree.get_children():
-            self.member_tree.delete(item)
-        
-        for member in filtered:
-            self.member_tree.insert("", "end", values=(
-                member["id"],
-                member["name"],
-                member["email"],
-                member["phone"],
-                member["address"]
-            ))
+        self.search_scheduler.schedule(
+            "members",
+            lambda: self.store.search("members", query),
+            self.show_members
+        )
     
     def search_events(self):
         query = self.event_search_entry.get().lower()
-        if not query:
+        dates = self.date_filter(self.event_date_entries)
+        if dates is None:
+            return
+        if not query and dates == (None, None):
+            self.search_scheduler.cancel("events")
             self.refresh_events()
             return
         
-        filtered = []
-        for event in events:
-            if (query in event["name"].lower() or 
-                query in event["date"].lower() or 
-                query in event["location"].lower() or 
-                query in (event["description"] or "").lower()):
-                filtered.append(event)
-        
-        # Update treeview
-        for item in self.event_tree.get_children():
-            self.event_tree.delete(item)
-        
-        for event in filtered:
-            self.event_tree.insert("", "end", values=(
-                event["id"],
-                event["name"],
-                event["date"],
-                event["location"],
-                event["description"]
-            ))
+        self.search_scheduler.schedule(
+            "events",
+            lambda: self.store.query("events", query, *dates),
+            self.show_events
+        )
     
     def search_donations(self):
         query = self.donation_search_entry.get().lower()
-        if not query:
+        dates = self.date_filter(self.donation_date_entries)
+        if dates is None:
+            return
+        if not query and dates == (None, None):
+            self.search_scheduler.cancel("donations")
             self.refresh_donations()
             return
         
-        filtered = []
-        for donation in donations:
-            if (query in donation["donor_name"].lower() or 
-                query in str(donation["amount"]).lower() or 
-                query in donation["date"].lower()):
-                filtered.append(donation)
-        
-        # Update treeview
-        for item in self.donation_tree.get_children():
-            self.donation_tree.delete(item)
-        
-        total = 0
-        for donation in filtered:
-            self.donation_tree.insert("", "end", values=(
-                donation["id"],
-                donation["donor_name"],
-                f"${donation['amount']:.2f}",
-                donation["date"]
-            ))
-            total += donation["amount"]
+        def search():
+            filtered = self.store.query("donations", query, *dates)
+            return filtered, summarize("donations", filtered)
         
-        # Update total
-        self.total_donations_var.set(f"Total Donations: ${total:.2f}")
+        self.search_scheduler.schedule("donations", search, lambda result: self.show_donations(*result))
     
     def search_blood_donations(self):
         query = self.blood_donation_search_entry.get().lower()
-        if not query:
+        dates = self.date_filter(self.blood_donation_date_entries)
+        if dates is None:
+            return
+        if not query and dates == (None, None):
+            self.search_scheduler.cancel("blood_donations")
             self.refresh_blood_donations()
             return
         
-        filtered = []
-        for bd in blood_donations:
-            if (query in bd["donor_name"].lower() or 
-                query in bd["blood_group"].lower() or 
-                query in bd["donation_date"].lower()):
-                filtered.append(bd)
-        
-        # Update treeview
-        for item in self.blood_donation_tree.get_children():
-            self.blood_donation_tree.delete(item)
-        
-        for bd in filtered:
-            self.blood_donation_tree.insert("", "end", values=(
-                bd["id"],
-                bd["donor_name"],
-                bd["blood_group"],
-                bd["donation_date"]
-            ))
+        def search():
+            filtered = self.store.query("blood_donations", query, *dates)
+            return filtered, summarize("blood_donations", filtered)
         
-        # Update total
-        self.total_blood_donations_var.set(f"Total Blood Donations: {len(filtered)}")
+        self.search_scheduler.schedule("blood_donations", search, lambda result: self.show_blood_donations(*result))
+    
+    # Date range filters
+    DATE_PRESETS = ["All Dates", "This Month", "Last Month", "Next Month", "Last Quarter", "This Year"]
+    
+    def add_date_filter(self, parent, on_change):
+        # From/To entries plus a menu of common ranges; returns the entries
+        entries = {}
+        for key, label in [("from", "From:"), ("to", "To:")]:
+            ctk.CTkLabel(parent, text=label).pack(side="left", padx=5)
+            entry = ctk.CTkEntry(parent, width=100, placeholder_text="YYYY-MM-DD")
+            entry.pack(side="left", padx=5)
+            entry.bind("<KeyRelease>", lambda e: on_change())
+            entries[key] = entry
+        
+        def apply_preset(preset):
+            self.set_date_filter(entries, *self.preset_dates(preset))
+            on_change()
+        
+        preset_menu = ctk.CTkOptionMenu(parent, values=self.DATE_PRESETS, width=120, command=apply_preset)
+        preset_menu.pack(side="left", padx=5)
+        entries["preset"] = preset_menu
+        return entries
+    
+    def set_date_filter(self, entries, date_from, date_to):
+        for key, value in [("from", date_from), ("to", date_to)]:
+            entries[key].delete(0, "end")
+            if value:
+                entries[key].insert(0, value)
+        if not date_from and not date_to:
+            entries["preset"].set("All Dates")
+    
+    def date_filter(self, entries):
+        # (date_from, date_to) with None for empty entries, or None while a date is incomplete
+        dates = []
+        for key in ("from", "to"):
+            value = entries[key].get().strip()
+            if value:
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    return None
+            dates.append(value or None)
+        return tuple(dates)
+    
+    def preset_dates(self, preset, today=None):
+        today = today or date.today()
+        month_start = today.replace(day=1)
+        def month_end(day):
+            return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        if preset == "This Month":
+            return month_start.isoformat(), month_end(today).isoformat()
+        if preset == "Last Month":
+            last = month_start - timedelta(days=1)
+            return last.replace(day=1).isoformat(), last.isoformat()
+        if preset == "Next Month":
+            first = month_end(today) + timedelta(days=1)
+            return first.isoformat(), month_end(first).isoformat()
+        if preset == "Last Quarter":
+            quarter_start = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+            end = quarter_start - timedelta(days=1)
+            return end.replace(month=end.month - 2, day=1).isoformat(), end.isoformat()
+        if preset == "This Year":
+            return today.replace(month=1, day=1).isoformat(), today.replace(month=12, day=31).isoformat()
+        return None, None
     
     # Clear search functions
     def clear_member_search(self):
         self.member_search_entry.delete(0, "end")
+        self.search_scheduler.cancel("members")
         self.refresh_members()
     
     def clear_event_search(self):
         self.event_search_entry.delete(0, "end")
+        self.set_date_filter(self.event_date_entries, None, None)
+        self.search_scheduler.cancel("events")
         self.refresh_events()
     
     def clear_donation_search(self):
         self.donation_search_entry.delete(0, "end")
+        self.set_date_filter(self.donation_date_entries, None, None)
+        self.search_scheduler.cancel("donations")
         self.refresh_donations()
     
     def clear_blood_donation_search(self):
         self.blood_donation_search_entry.delete(0, "end")
+        self.set_date_filter(self.blood_donation_date_entries, None, None)
+        self.search_scheduler.cancel("blood_donations")
         self.refresh_blood_donations()
     
     # Clear entry fields functions
@@ -1039,6 +1426,7 @@ class OrganizationApp:
             entry.delete(0, "end")
     
     # Selection handlers
+    @timed("on_member_select")
     def on_member_select(self, event):
         selected_item = self.member_tree.selection()
         if not selected_item:
@@ -1047,20 +1435,20 @@ class OrganizationApp:
         item = self.member_tree.item(selected_item)
         member_id = item["values"][0]
         
-        for member in members:
-            if member["id"] == member_id:
-                self.member_entries["name"].delete(0, "end")
-                self.member_entries["name"].insert(0, member["name"])
-                self.member_entries["email"].delete(0, "end")
-                self.member_entries["email"].insert(0, member["email"])
-                self.member_entries["phone"].delete(0, "end")
-                self.member_entries["phone"].insert(0, member["phone"])
-                self.member_entries["address"].delete(0, "end")
-                self.member_entries["address"].insert(0, member["address"])
-                self.member_entries["password"].delete(0, "end")
-                self.member_entries["password"].insert(0, member["password"])
-                break
+        member = self.store.get("members", member_id)
+        if member:
+            self.member_entries["name"].delete(0, "end")
+            self.member_entries["name"].insert(0, member["name"])
+            self.member_entries["email"].delete(0, "end")
+            self.member_entries["email"].insert(0, member["email"])
+            self.member_entries["phone"].delete(0, "end")
+            self.member_entries["phone"].insert(0, member["phone"])
+            self.member_entries["address"].delete(0, "end")
+            self.member_entries["address"].insert(0, member["address"])
+            self.member_entries["password"].delete(0, "end")
+            self.member_entries["password"].insert(0, member["password"])
     
+    @timed("on_event_select")
     def on_event_select(self, event):
         selected_item = self.event_tree.selection()
         if not selected_item:
@@ -1069,18 +1457,18 @@ class OrganizationApp:
         item = self.event_tree.item(selected_item)
         event_id = item["values"][0]
         
-        for event in events:
-            if event["id"] == event_id:
-                self.event_entries["name"].delete(0, "end")
-                self.event_entries["name"].insert(0, event["name"])
-                self.event_entries["date"].delete(0, "end")
-                self.event_entries["date"].insert(0, event["date"])
-                self.event_entries["location"].delete(0, "end")
-                self.event_entries["location"].insert(0, event["location"])
-                self.event_entries["description"].delete(0, "end")
-                self.event_entries["description"].insert(0, event.get("description", ""))
-                break
+        event = self.store.get("events", event_id)
+        if event:
+            self.event_entries["name"].delete(0, "end")
+            self.event_entries["name"].insert(0, event["name"])
+            self.event_entries["date"].delete(0, "end")
+            self.event_entries["date"].insert(0, event["date"])
+            self.event_entries["location"].delete(0, "end")
+            self.event_entries["location"].insert(0, event["location"])
+            self.event_entries["description"].delete(0, "end")
+            self.event_entries["description"].insert(0, event.get("description", ""))
     
+    @timed("on_donation_select")
     def on_donation_select(self, event):
         selected_item = self.donation_tree.selection()
         if not selected_item:
@@ -1089,16 +1477,16 @@ class OrganizationApp:
         item = self.donation_tree.item(selected_item)
         donation_id = item["values"][0]
         
-        for donation in donations:
-            if donation["id"] == donation_id:
-                self.donation_entries["donor"].delete(0, "end")
-                self.donation_entries["donor"].insert(0, donation["donor_name"])
-                self.donation_entries["amount"].delete(0, "end")
-                self.donation_entries["amount"].insert(0, str(donation["amount"]))
-                self.donation_entries["date"].delete(0, "end")
-                self.donation_entries["date"].insert(0, donation["date"])
-                break
+        donation = self.store.get("donations", donation_id)
+        if donation:
+            self.donation_entries["donor"].delete(0, "end")
+            self.donation_entries["donor"].insert(0, donation["donor_name"])
+            self.donation_entries["amount"].delete(0, "end")
+            self.donation_entries["amount"].insert(0, str(donation["amount"]))
+            self.donation_entries["date"].delete(0, "end")
+            self.donation_entries["date"].insert(0, donation["date"])
     
+    @timed("on_blood_donation_select")
     def on_blood_donation_select(self, event):
         selected_item = self.blood_donation_tree.selection()
         if not selected_item:
@@ -1107,85 +1495,127 @@ class OrganizationApp:
         item = self.blood_donation_tree.item(selected_item)
         blood_donation_id = item["values"][0]
         
-        for bd in blood_donations:
-            if bd["id"] == blood_donation_id:
-                self.blood_donation_entries["donor"].delete(0, "end")
-                self.blood_donation_entries["donor"].insert(0, bd["donor_name"])
-                self.blood_donation_entries["blood"].delete(0, "end")
-                self.blood_donation_entries["blood"].insert(0, bd["blood_group"])
-                self.blood_donation_entries["donation"].delete(0, "end")
-                self.blood_donation_entries["donation"].insert(0, bd["donation_date"])
-                break
+        bd = self.store.get("blood_donations", blood_donation_id)
+        if bd:
+            self.blood_donation_entries["donor"].delete(0, "end")
+            self.blood_donation_entries["donor"].insert(0, bd["donor_name"])
+            self.blood_donation_entries["blood"].delete(0, "end")
+            self.blood_donation_entries["blood"].insert(0, bd["blood_group"])
+            self.blood_donation_entries["donation"].delete(0, "end")
+            self.blood_donation_entries["donation"].insert(0, bd["donation_date"])
     
     # Refresh functions
+    @timed("refresh_members", rows=lambda self: self.store.count("members"))
     def refresh_members(self):
-        # Clear treeview
-        for item in self.member_tree.get_children():
-            self.member_tree.delete(item)
-        
-        # Add members to treeview
-        for member in members:
-            self.member_tree.insert("", "end", values=(
-                member["id"],
-                member["name"],
-                member["email"],
-                member["phone"],
-                member["address"]
-            ))
+        if "Members" not in self.built_tabs:
+            return
+        self.show_members(self.store.all("members"))
     
+    @timed("refresh_events", rows=lambda self: self.store.count("events"))
     def refresh_events(self):
-        # Clear treeview
-        for item in self.event_tree.get_children():
-            self.event_tree.delete(item)
-        
-        # Add events to treeview
-        for event in events:
-            self.event_tree.insert("", "end", values=(
-                event["id"],
-                event["name"],
-                event["date"],
-                event["location"],
-                event["description"]
-            ))
+        if "Events" not in self.built_tabs:
+            return
+        self.show_events(self.store.all("events"))
     
+    @timed("refresh_donations", rows=lambda self: self.store.count("donations"))
     def refresh_donations(self):
-        # Clear treeview
-        for item in self.donation_tree.get_children():
-            self.donation_tree.delete(item)
-        
-        # Add donations to treeview
-        total = 0
-        for donation in donations:
-            self.donation_tree.insert("", "end", values=(
-                donation["id"],
-                donation["donor_name"],
-                f"${donation['amount']:.2f}",
-                donation["date"]
-            ))
-            total += donation["amount"]
-        
-        # Update total
-        self.total_donations_var.set(f"Total Donations: ${total:.2f}")
+        if "Donations" not in self.built_tabs:
+            return
+        self.show_donations(self.store.all("donations"), self.store.aggregates("donations"))
     
+    @timed("refresh_blood_donations", rows=lambda self: self.store.count("blood_donations"))
     def refresh_blood_donations(self):
-        # Clear treeview
-        for item in self.blood_donation_tree.get_children():
-            self.blood_donation_tree.delete(item)
-        
-        # Add blood donations to treeview
-        for bd in blood_donations:
-            self.blood_donation_tree.insert("", "end", values=(
-                bd["id"],
-                bd["donor_name"],
-                bd["blood_group"],
-                bd["donation_date"]
-            ))
+        if "Blood Donations" not in self.built_tabs:
+            return
+        self.show_blood_donations(self.store.all("blood_donations"), self.store.aggregates("blood_donations"))
+    
+    def show_members(self, rows):
+        self.member_tree.set_rows(rows)
+    
+    def show_events(self, rows):
+        self.event_tree.set_rows(rows)
+    
+    # stats are the Aggregates of the rows shown
+    def show_donations(self, rows, stats):
+        self.donation_tree.set_rows(rows)
         
         # Update total
-        self.total_blood_donations_var.set(f"Total Blood Donations: {len(blood_donations)}")
+        self.total_donations_var.set(f"Total Donations: ${stats.total:.2f}")
+    
+    def show_blood_donations(self, rows, stats):
+        self.blood_donation_tree.set_rows(rows)
+        
+        # Update total, with the count per blood group
+        groups = ", ".join(f"{group}: {count}" for group, count in sorted(stats.by_group.items()))
+        summary = f"Total Blood Donations: {stats.count}"
+        if groups:
+            summary += f"  ({groups})"
+        self.total_blood_donations_var.set(summary)
+    
+    # Treeview row values
+    def member_row(self, member):
+        return (
+            member["id"],
+            member["name"],
+            member["email"],
+            member["phone"],
+            member["address"]
+        )
+    
+    def event_row(self, event):
+        return (
+            event["id"],
+            event["name"],
+            event["date"],
+            event["location"],
+            event["description"]
+        )
+    
+    def donation_row(self, donation):
+        return (
+            donation["id"],
+            donation["donor_name"],
+            f"${donation['amount']:.2f}",
+            donation["date"]
+        )
+    
+    def perf_row(self, stat):
+        return (
+            stat["name"],
+            stat["count"],
+            stat["rows"],
+            f"{stat['p50_ms']:.2f}",
+            f"{stat['p95_ms']:.2f}",
+            f"{stat['max_ms']:.2f}",
+            f"{stat['total_ms']:.1f}"
+        )
+    
+    def donor_status_row(self, status):
+        return (
+            status.name,
+            status.blood_group,
+            status.last_donation,
+            status.next_eligible,
+            status.donations
+        )
+    
+    def donor_history_row(self, item):
+        entity, record = item
+        if entity == "donations":
+            return ("Donation", record["id"], record["date"], f"${record['amount']:.2f}")
+        return ("Blood Donation", record["id"], record["donation_date"], record["blood_group"])
+    
+    def blood_donation_row(self, bd):
+        return (
+            bd["id"],
+            bd["donor_name"],
+            bd["blood_group"],
+            bd["donation_date"]
+        )
 
 class LoginWindow:
-    def __init__(self):
+    def __init__(self, started=None):
+        started = started or time.perf_counter()
         self.window = ctk.CTk()
         self.window.title("Login")
         self.window.geometry("400x300")
@@ -1227,8 +1657,37 @@ class LoginWindow:
         self.username_entry.bind("<Return>", lambda e: self.login())
         self.password_entry.bind("<Return>", lambda e: self.login())
         
+        # The database loads on a worker thread while the form is already usable;
+        # a login entered before it is ready goes ahead once it is
+        self.store = None
+        self.pending_login = False
+        self.loading_bar = ctk.CTkProgressBar(self.window, mode="indeterminate")
+        self.loading_bar.pack(fill="x", padx=40)
+        self.loading_bar.start()
+        self.load_task = BackgroundTask(self.window, lambda progress, cancelled: open_storage(),
+                                        self.on_store_loaded, on_error=self.on_store_error)
+        
+        # Time until the login form can take input
+        self.startup_seconds = None
+        self.window.after_idle(lambda: setattr(self, "startup_seconds", time.perf_counter() - started))
+        
         self.window.mainloop()
     
+    def on_store_loaded(self, store):
+        self.store = store
+        # The search and eligibility indexes are built in the background while the user logs in
+        store.start_index_builder()
+        self.loading_bar.stop()
+        self.loading_bar.pack_forget()
+        if self.pending_login:
+            self.pending_login = False
+            self.login()
+    
+    def on_store_error(self, error):
+        self.loading_bar.stop()
+        self.loading_bar.pack_forget()
+        self.status_label.configure(text=f"Error loading database: {str(error)}", text_color="red")
+    
     def login(self):
         username = self.username_entry.get().upper()
         password = self.password_entry.get()
@@ -1237,18 +1696,36 @@ class LoginWindow:
             self.status_label.configure(text="Username and password are required")
             return
         
-        if username in users and users[username] == password:
+        if self.store is None:
+            if self.load_task.finished:
+                self.status_label.configure(text="The database could not be loaded", text_color="red")
+                return
+            self.pending_login = True
+            self.status_label.configure(text="Loading database...", text_color="gray")
+            return
+        
+        if self.store.authenticate(username, password):
             self.status_label.configure(text="Login successful!", text_color="green")
             self.window.after(1000, self.open_main_app)
         else:
-            self.status_label.configure(text="Invalid username or password")
+            self.status_label.configure(text="Invalid username or password", text_color="red")
     
     def open_main_app(self):
         self.window.destroy()
         root = ctk.CTk()
-        app = OrganizationApp(root)
+        app = OrganizationApp(root, self.store)
         root.mainloop()
+        # Close the API's connections before the store goes away
+        if app.api_server is not None:
+            app.api_server.stop()
+        # Write out anything the background writer has not saved yet
+        self.store.close()
+
+def main():
+    started = time.perf_counter()
+    setup_appearance()
+    LoginWindow(started)
 
 # Start with login window
 if __name__ == "__main__":
-    LoginWindow()
\ No newline at end of file
+    main()
@@ -0,0 +1,243 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Timers and counters for the hot paths, shown in Help > Performance.
+# Recording is off by default; a timed function then only pays for one attribute check.
+
+# Whether recording starts enabled
+PERF_ENABLED = False
+
+# Latest durations kept per timer for the percentiles; count, total and max cover every call
+MAX_SAMPLES = 1000
+
+# Latest calls kept for the trace export
+MAX_EVENTS = 20000
+
+# Where profiling sessions are saved
+PROFILE_DIR = "profiles"
+
+# Stack frames kept per allocation while profiling, and lines in each report
+TRACEMALLOC_FRAMES = 10
+REPORT_LINES = 60
+
+class Stat:
+    # Durations (seconds) and rows of one timer
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds, rows=None):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if rows is not None:
+            self.rows += rows
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "count": self.count,
+            "rows": self.rows,
+            "total_ms": self.total * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+class Recorder:
+    def __init__(self, enabled=PERF_ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stats = {}
+        # (name, start, seconds, thread name, rows) of the latest calls
+        self.events = deque(maxlen=MAX_EVENTS)
+
+    def record(self, name, start, seconds, rows=None):
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = Stat(name)
+            stat.add(seconds, rows)
+            self.events.append((name, start, seconds, threading.current_thread().name, rows))
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def reset(self):
+        with self.lock:
+            self.started = time.perf_counter()
+            self.stats = {}
+            self.events.clear()
+
+    def summary(self):
+        # Stats of every timer as dicts, the most total time first
+        with self.lock:
+            stats = [stat.as_dict() for stat in self.stats.values()]
+        return sorted(stats, key=lambda stat: stat["total_ms"], reverse=True)
+
+    def export_json(self, filename):
+        write_file(filename, {"recorded_seconds": time.perf_counter() - self.started, "stats": self.summary()})
+
+    def export_trace(self, filename, since=None):
+        # Chrome trace event format, viewable in chrome://tracing or Perfetto.
+        # since is a time.perf_counter() value; calls that started before it are left out.
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+        trace = []
+        for name, start, seconds, thread, rows in events:
+            if since is not None and start < since:
+                continue
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.started) * 1e6,
+                "dur": seconds * 1e6,
+                "pid": pid,
+                "tid": thread,
+            }
+            if rows is not None:
+                event["args"] = {"rows": rows}
+            trace.append(event)
+        write_file(filename, {"traceEvents": trace, "displayTimeUnit": "ms"})
+
+class Timer:
+    # with recorder.timer(name) as timer: ...; set timer.rows to count the rows processed
+    __slots__ = ("recorder", "name", "rows", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.rows = None
+        self.start = None
+
+    def __enter__(self):
+        if self.recorder.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.recorder.record(self.name, self.start, time.perf_counter() - self.start, self.rows)
+
+def write_file(filename, data):
+    temp_file = filename + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(temp_file, filename)
+
+recorder = Recorder()
+
+def timed(name, rows=None):
+    # Decorator timing every call of a function under name.
+    # rows, if given, is called with the function's arguments and returns the rows it processes.
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(name, start, time.perf_counter() - start,
+                                rows(*args, **kwargs) if rows else None)
+        return wrapper
+    return decorate
+
+class ProfileSession:
+    # cProfile and tracemalloc over one stretch of work, e.g. typing in a search box.
+    # cProfile follows the thread that started the session (the Tk thread); the search and
+    # save threads show up in the trace written next to it.
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.profiler = None
+        self.before = None
+        self.after = None
+        self.was_tracing = False
+        self.was_recording = False
+        self.started = None
+        self.start_clock = None
+
+    @property
+    def running(self):
+        return self.profiler is not None and self.after is None
+
+    def start(self):
+        self.started = time.strftime("%Y%m%d-%H%M%S")
+        self.start_clock = time.perf_counter()
+        self.was_recording = recorder.enabled
+        recorder.enabled = True
+        self.was_tracing = tracemalloc.is_tracing()
+        if not self.was_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.before = tracemalloc.take_snapshot()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        # Stops measuring; the reports are written by save(), which may run on another thread
+        self.profiler.disable()
+        self.after = tracemalloc.take_snapshot()
+        if not self.was_tracing:
+            tracemalloc.stop()
+        recorder.enabled = self.was_recording
+
+    def save(self):
+        # Writes <prefix>.prof (for pstats or snakeviz), <prefix>-profile.txt, <prefix>-memory.txt
+        # and <prefix>-trace.json; returns their names
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f"profile-{self.started}")
+        files = [prefix + ".prof", prefix + "-profile.txt", prefix + "-memory.txt", prefix + "-trace.json"]
+        self.profiler.dump_stats(files[0])
+
+        report = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=report)
+        stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        stats.sort_stats("tottime").print_stats(REPORT_LINES)
+        with open(files[1], "w") as f:
+            f.write(report.getvalue())
+
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        after = self.after.filter_traces(ignore)
+        before = self.before.filter_traces(ignore)
+        with open(files[2], "w") as f:
+            current = sum(stat.size for stat in after.statistics("filename"))
+            f.write(f"Traced memory at the end: {current / 1024:,.1f} KiB\n\n")
+            f.write(f"Top {REPORT_LINES} allocation changes by line\n")
+            for stat in after.compare_to(before, "lineno")[:REPORT_LINES]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {REPORT_LINES // 3} allocation changes by call stack\n")
+            for stat in after.compare_to(before, "traceback")[:REPORT_LINES // 3]:
+                f.write(f"\n{stat}\n")
+                for line in stat.traceback.format():
+                    f.write(f"{line}\n")
+
+        recorder.export_trace(files[3], since=self.start_clock)
+        return files
@@ -0,0 +1,161 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Binary snapshot written next to the JSON database so startup does not have to parse it.
+#
+# Layout:
+#   MAGIC, header length (uint32), header (JSON)
+#   per entity: offset table (count + 1 uint64) followed by the encoded records
+#
+# Table positions in the header are relative to the end of the header. Each record is a
+# compact JSON array of its values in the order of the entity's columns, or a JSON object
+# when its keys differ from them, followed by a comma so that a run of records is a JSON
+# list once wrapped in brackets. The header also records the source_stamp of the JSON file
+# written with it; once the JSON file changes the snapshot is ignored.
+MAGIC = b"JGPSNAP1"
+HEADER = struct.Struct("<I")
+OFFSET_TYPE = "Q"
+
+# Records decoded together when iterating over a whole table
+DECODE_CHUNK = 10000
+
+def source_stamp(database_file):
+    # Identifies one version of the JSON file; every save replaces it with a new file
+    try:
+        stat = os.stat(database_file)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+def write_snapshot(data, snapshot_file, source, entities, temp_file=None):
+    # data is in the DATABASE_FILE layout and source the source_stamp of the JSON file holding
+    # the same data; returns True once snapshot_file is in place
+    temp_file = temp_file or snapshot_file + ".tmp"
+    try:
+        tables = {}
+        blobs = []
+        position = 0
+        for entity in entities:
+            records = data.get(entity, [])
+            columns = list(records[0]) if records else []
+            offsets = array(OFFSET_TYPE, [0])
+            encoded = []
+            size = 0
+            max_id = 0
+            for record in records:
+                row = [record[column] for column in columns] if list(record) == columns else record
+                line = json.dumps(row, separators=(",", ":")).encode("utf-8") + b","
+                encoded.append(line)
+                size += len(line)
+                offsets.append(size)
+                max_id = max(max_id, record["id"])
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            offsets = offsets.tobytes()
+            tables[entity] = {
+                "count": len(records),
+                "max_id": max_id,
+                "columns": columns,
+                "offsets": position,
+                "data": position + len(offsets),
+            }
+            blobs.append(offsets)
+            blobs.append(b"".join(encoded))
+            position += len(offsets) + size
+
+        header = json.dumps({
+            "source": source,
+            "users": data.get("users", {}),
+            "sequences": data.get("sequences", {}),
+            "journal_seq": data.get("journal_seq", 0),
+            "tables": tables,
+        }).encode("utf-8")
+        with open(temp_file, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, snapshot_file)
+        return True
+    except (OSError, TypeError, ValueError, KeyError):
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+
+class SnapshotTable:
+    # Read-only sequence of the records of one entity, decoded from the mapped file on access
+    lazy = True
+
+    def __init__(self, buffer, base, table):
+        self.buffer = buffer
+        self.columns = table["columns"]
+        self.count = table["count"]
+        self.max_id = table["max_id"]
+        self.data = base + table["data"]
+        start = base + table["offsets"]
+        self.offsets = array(OFFSET_TYPE)
+        self.offsets.frombytes(buffer[start:start + (self.count + 1) * self.offsets.itemsize])
+        if sys.byteorder != "little":
+            self.offsets.byteswap()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.record(index)
+
+    def __iter__(self):
+        # Whole chunks are decoded with one json.loads call
+        columns = self.columns
+        for start in range(0, self.count, DECODE_CHUNK):
+            end = min(start + DECODE_CHUNK, self.count)
+            chunk = self.buffer[self.data + self.offsets[start]:self.data + self.offsets[end] - 1]
+            for row in json.loads(b"[" + chunk + b"]"):
+                yield row if isinstance(row, dict) else dict(zip(columns, row))
+
+    def copy(self):
+        # The table never changes
+        return self
+
+    def record(self, index):
+        row = json.loads(self.buffer[self.data + self.offsets[index]:self.data + self.offsets[index + 1] - 1])
+        if isinstance(row, dict):
+            return row
+        return dict(zip(self.columns, row))
+
+def read_snapshot_file(snapshot_file, database_file, entities):
+    # Data in the DATABASE_FILE layout with a SnapshotTable per entity,
+    # or None when there is no usable snapshot for the current database_file
+    try:
+        with open(snapshot_file, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if buffer[:len(MAGIC)] == MAGIC:
+            (header_size,) = HEADER.unpack_from(buffer, len(MAGIC))
+            base = len(MAGIC) + HEADER.size + header_size
+            header = json.loads(buffer[len(MAGIC) + HEADER.size:base])
+            if header["source"] == source_stamp(database_file):
+                data = {"users": header["users"], "sequences": header["sequences"],
+                        "journal_seq": header.get("journal_seq", 0)}
+                for entity in entities:
+                    data[entity] = SnapshotTable(buffer, base, header["tables"][entity])
+                return data
+    except (ValueError, KeyError, struct.error):
+        pass
+    buffer.close()
+    return None
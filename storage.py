@@ -0,0 +1,1437 @@
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from decimal import Decimal
+
+from blood import DEFERRAL_DAYS, EligibilityIndex
+from columnar import ColumnarCollection
+from donors import DONOR_FIELDS, DonorIndex
+from filelock import FileLock
+from indexes import Aggregates, DateIndex, NGramIndex, UniqueIndex, normalize_email, normalize_phone
+from perf import timed
+from snapshot import read_snapshot_file, source_stamp, write_snapshot
+
+# Database file
+DATABASE_FILE = "organization_data.json"
+
+# Journal of changes made since DATABASE_FILE was last written
+JOURNAL_FILE = "organization_data.journal"
+
+# Held by a process while it reads or writes the journal, so several processes can share the database
+LOCK_FILE = "organization_data.lock"
+
+# Binary copy of DATABASE_FILE that loads without parsing it; None to only write the JSON file
+SNAPSHOT_FILE = "organization_data.snap"
+
+# SQLite database used by the "sqlite" backend
+SQLITE_FILE = "organization_data.db"
+
+# "json" keeps everything in memory and persists to DATABASE_FILE, "sqlite" uses SQLITE_FILE
+STORAGE_BACKEND = "json"
+
+# "journal" appends one record per change, "snapshot" rewrites DATABASE_FILE on every change
+STORAGE_MODE = "journal"
+
+# Fold the journal into DATABASE_FILE once it holds this many records
+COMPACT_EVERY = 1000
+
+# The background writer saves once no change came in for COALESCE_DELAY seconds,
+# and at the latest COALESCE_MAX_DELAY seconds after the first unsaved change
+COALESCE_DELAY = 2.0
+COALESCE_MAX_DELAY = 10.0
+
+# Records added per turn of the lock while an index is built, so the GUI never waits for a
+# whole build
+INDEX_BUILD_CHUNK = 1000
+
+ENTITIES = ("members", "events", "donations", "blood_donations")
+
+# Columns of each entity, not counting the id
+COLUMNS = {
+    "members": ("name", "email", "phone", "address", "password"),
+    "events": ("name", "date", "location", "description"),
+    "donations": ("donor_name", "amount", "date"),
+    "blood_donations": ("donor_name", "blood_group", "donation_date"),
+}
+
+# Fields matched by the search box of each tab
+SEARCH_FIELDS = {
+    "members": ("name", "email", "phone", "address"),
+    "events": ("name", "date", "location", "description"),
+    "donations": ("donor_name", "amount", "date"),
+    "blood_donations": ("donor_name", "blood_group", "donation_date"),
+}
+
+# Fields looked up through a maintained index, with the normalization applied to their values.
+# Member emails must be unique regardless of case.
+LOOKUP_FIELDS = {
+    "members": {"email": normalize_email, "phone": normalize_phone},
+}
+
+# Entities held column by column in memory, with the storage type of each field
+COLUMNAR_ENTITIES = {
+    "donations": {"donor_name": "text", "amount": "float", "date": "date"},
+    "blood_donations": {"donor_name": "text", "blood_group": "category", "donation_date": "date"},
+}
+
+# "YYYY-MM-DD" date field of each entity, used by date range queries
+DATE_FIELDS = {
+    "events": "date",
+    "donations": "date",
+    "blood_donations": "donation_date",
+}
+
+# Fields feeding the running aggregates of each entity
+AGGREGATE_FIELDS = {
+    "donations": {"amount_field": "amount", "date_field": "date"},
+    "blood_donations": {"date_field": "donation_date", "group_field": "blood_group"},
+}
+
+# Default data structure
+default_data = {
+    "members": [],
+    "events": [],
+    "donations": [],
+    "blood_donations": [],
+    "users": {"123456": "123456"}  # Default admin credentials
+}
+
+class StorageError(Exception):
+    pass
+
+def synchronized(method):
+    # Searches run on a worker thread, so every access to a storage goes through its lock
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def summarize(entity, records):
+    # Aggregates over an arbitrary set of records, e.g. a search result
+    aggregates = Aggregates(**AGGREGATE_FIELDS.get(entity, {}))
+    for record in records:
+        aggregates.add(record)
+    return aggregates
+
+def record_matches(entity, record, query):
+    # Case-insensitive substring match against the searchable fields, query must already be lower-case
+    for field in SEARCH_FIELDS[entity]:
+        value = record.get(field)
+        if value is not None and query in str(value).lower():
+            return True
+    return False
+
+# Load or initialize database
+def read_snapshot(database_file=DATABASE_FILE):
+    if os.path.exists(database_file):
+        try:
+            with open(database_file, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+    return copy.deepcopy(default_data)
+
+@timed("load_database")
+def load_database(database_file=DATABASE_FILE, journal_file=JOURNAL_FILE, lock_file=LOCK_FILE):
+    # The database with every journaled change applied; journal_seq is the last of them
+    with FileLock(lock_file):
+        data = read_snapshot(database_file)
+        base, entries, end = read_journal(journal_file)
+    collections = load_collections(data)
+    # Entries up to journal_seq are in the snapshot already
+    seq = data.get("journal_seq", 0)
+    for entry in entries:
+        if entry["seq"] > seq:
+            collections[entry["entity"]].apply(entry)
+            seq = entry["seq"]
+    for entity, collection in collections.items():
+        data[entity] = [dict(record) for record in collection.view()]
+    data["sequences"] = {entity: collection.next_id for entity, collection in collections.items()}
+    data["journal_seq"] = seq
+    return data
+
+def write_json_file(data, filename):
+    # Writes and syncs filename; the caller moves it into place
+    try:
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+    except IOError:
+        if os.path.exists(filename):
+            os.remove(filename)
+        return False
+
+@timed("save_database", rows=lambda data, *args, **kwargs: sum(len(data.get(entity, [])) for entity in ENTITIES))
+def save_database(data, database_file=DATABASE_FILE, journal_file=JOURNAL_FILE, lock_file=LOCK_FILE):
+    # data holds the journal's changes up to its journal_seq (0 if it has none), e.g. as
+    # returned by load_database. Later entries stay in the journal; data older than the
+    # current database file is refused, since the changes in between would be lost.
+    seq = data.get("journal_seq", 0)
+    # Write to a temporary file first so a crash never leaves a half-written database
+    temp_file = f"{database_file}.{os.getpid()}.tmp"
+    with FileLock(lock_file):
+        base, entries, end = read_journal(journal_file)
+        if base > seq:
+            return False
+        if not write_json_file({**data, "journal_seq": seq}, temp_file):
+            return False
+        try:
+            os.replace(temp_file, database_file)
+        except IOError:
+            os.remove(temp_file)
+            return False
+        # The snapshot now contains every journaled change up to seq
+        return write_journal(journal_file, seq, [entry for entry in entries if entry["seq"] > seq]) is not None
+
+# Journal layout: an optional header line {"base": n} saying that every change up to sequence
+# number n is in DATABASE_FILE, then one line per change, {"seq": n, "op": ..., "entity": ...,
+# "record": ...}. Sequence numbers count every change ever made, by any process; entries of
+# older journals have none and are numbered after the one before them.
+
+def journal_header(base):
+    return json.dumps({"base": base}) + "\n"
+
+def journal_entry(op, entity, record, seq=None):
+    # Deletes only need the id of the removed record
+    record = {"id": record["id"]} if op == "delete" else dict(record)
+    entry = {"op": op, "entity": entity, "record": record}
+    if seq is not None:
+        entry = {"seq": seq, **entry}
+    return json.dumps(entry, separators=(",", ":")) + "\n"
+
+def read_journal(journal_file, offset=0, seq=None):
+    # Complete entries from byte offset on, each with its "seq"; seq is the number of the entry
+    # before offset. Returns (header base, entries, offset after the last complete entry).
+    # A crash can leave a torn last line behind; it and anything after it are not read.
+    base = 0
+    entries = []
+    try:
+        with open(journal_file, "rb") as f:
+            line = f.readline()
+            header = None
+            if line.endswith(b"\n"):
+                try:
+                    header = json.loads(line)
+                except ValueError:
+                    pass
+            if isinstance(header, dict) and "base" in header:
+                base = header["base"]
+                start = len(line)
+            else:
+                start = 0
+            if not offset:
+                offset = start
+                seq = base
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                seq = entry.setdefault("seq", seq + 1)
+                entries.append(entry)
+                offset += len(line)
+    except IOError:
+        pass
+    return base, entries, offset
+
+def write_journal(journal_file, base, entries):
+    # Replaces the journal with a header for base followed by entries; needs the file lock.
+    # Returns the lines written, or None when the old journal had to stay.
+    lines = [journal_header(base)]
+    lines.extend(journal_entry(entry["op"], entry["entity"], entry["record"], entry["seq"]) for entry in entries)
+    temp_file = f"{journal_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, "w") as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, journal_file)
+    except IOError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return None
+    return lines
+
+class IndexBuild:
+    # Stands in for an index in a collection while the index is filled a chunk at a time.
+    # Records the build has not reached yet are left to it, so changes to them are skipped;
+    # changes to the others, and new records, go to the index right away.
+
+    def __init__(self, index, ids):
+        self.index = index
+        self.ids = ids
+        self.pending = set(ids)
+
+    def add(self, record):
+        if record["id"] not in self.pending:
+            self.index.add(record)
+
+    def remove(self, record):
+        if record["id"] not in self.pending:
+            self.index.remove(record)
+
+    def fill(self, collection, ids):
+        # Adds the records of ids that still exist; needs the storage lock
+        records = []
+        for record_id in ids:
+            self.pending.discard(record_id)
+            record = collection.get(record_id)
+            if record is not None:
+                records.append(record)
+        self.index.add_many(records)
+
+class Collection:
+    # Records of one entity in insertion order, indexed by id.
+    # next_id is a persistent sequence, so the id of a deleted record is never handed out again.
+    # Indexes are objects with add(record) and remove(record), kept up to date on every change.
+
+    def __init__(self, records=(), next_id=None):
+        # A table from the binary snapshot is only decoded once records are needed by id
+        self._table = records if getattr(records, "lazy", False) else None
+        self._records = {}
+        if self._table is None:
+            for record in records:
+                self._records[record["id"]] = record
+            max_id = max(self._records, default=0)
+        else:
+            max_id = self._table.max_id
+        self.next_id = max(next_id or 1, max_id + 1)
+        self.indexes = []
+        # Ordered list of the records, built on first use and kept up to date afterwards
+        self._view = None
+
+    @property
+    def records(self):
+        if self._table is not None:
+            self._records = {record["id"]: record for record in self._table}
+            self._table = None
+        return self._records
+
+    def __len__(self):
+        if self._table is not None:
+            return len(self._table)
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __contains__(self, record_id):
+        return record_id in self.records
+
+    def get(self, record_id):
+        return self.records.get(record_id)
+
+    def record_ids(self):
+        return list(self.records)
+
+    def view(self):
+        if self._table is not None:
+            return self._table
+        if self._view is None:
+            self._view = list(self.records.values())
+        return self._view
+
+    def add_index(self, index):
+        for record in self.records.values():
+            index.add(record)
+        self.indexes.append(index)
+
+    def allocate_id(self):
+        record_id = self.next_id
+        self.next_id += 1
+        return record_id
+
+    def add(self, record):
+        record_id = record["id"]
+        self.records[record_id] = record
+        if record_id >= self.next_id:
+            self.next_id = record_id + 1
+        if self._view is not None:
+            self._view.append(record)
+        for index in self.indexes:
+            index.add(record)
+        return record
+
+    def update(self, record_id, fields):
+        record = self.records.get(record_id)
+        if record is None:
+            return None
+        for index in self.indexes:
+            index.remove(record)
+        record.update(fields)
+        record["id"] = record_id
+        for index in self.indexes:
+            index.add(record)
+        return record
+
+    def remove(self, record_id):
+        record = self.records.pop(record_id, None)
+        if record is None:
+            return None
+        if self._view is not None:
+            # Ids normally grow in insertion order, so the record is found by binary search;
+            # otherwise the view is rebuilt when next needed
+            position = bisect_left(self._view, record_id, key=lambda view_record: view_record["id"])
+            if position < len(self._view) and self._view[position] is record:
+                del self._view[position]
+            else:
+                self._view = None
+        for index in self.indexes:
+            index.remove(record)
+        return record
+
+    def apply(self, entry):
+        # Replays one journal entry
+        record = entry["record"]
+        if entry["op"] == "delete":
+            self.remove(record["id"])
+        elif record["id"] in self.records:
+            self.update(record["id"], record)
+        else:
+            self.add(record)
+
+def load_collections(data):
+    sequences = data.get("sequences", {})
+    collections = {}
+    for entity in ENTITIES:
+        if entity in COLUMNAR_ENTITIES:
+            collections[entity] = ColumnarCollection(
+                COLUMNAR_ENTITIES[entity], data.get(entity, []), sequences.get(entity))
+        else:
+            collections[entity] = Collection(data.get(entity, []), sequences.get(entity))
+    return collections
+
+class Storage:
+    # Common interface of the storage backends used by OrganizationApp
+
+    # Days a blood donor waits between donations, see set_deferral
+    deferral_days = DEFERRAL_DAYS
+
+    def all(self, entity):
+        raise NotImplementedError
+
+    def get(self, entity, record_id):
+        raise NotImplementedError
+
+    def insert(self, entity, record):
+        raise NotImplementedError
+
+    def insert_many(self, entity, records):
+        # Inserts all records with a single write; either all of them are stored or none
+        raise NotImplementedError
+
+    def update(self, entity, record_id, fields):
+        raise NotImplementedError
+
+    def update_many(self, entity, changes):
+        # changes maps record ids to fields; updates them all with a single write and
+        # returns the updated records, either all or none
+        raise NotImplementedError
+
+    def delete(self, entity, record_id):
+        raise NotImplementedError
+
+    def search(self, entity, query):
+        raise NotImplementedError
+
+    def date_range(self, entity, date_from=None, date_to=None):
+        # Records dated date_from to date_to (both inclusive, either may be None), in date order
+        raise NotImplementedError
+
+    def range_total(self, entity, date_from=None, date_to=None):
+        # Sum of the amounts of the records in a date range
+        raise NotImplementedError
+
+    def query(self, entity, query="", date_from=None, date_to=None):
+        # Records matching the search text and the date range, as shown in the tabs
+        if date_from or date_to:
+            rows = self.date_range(entity, date_from, date_to)
+            if query:
+                query = query.lower()
+                rows = [record for record in rows if record_matches(entity, record, query)]
+            return rows
+        return self.search(entity, query) if query else self.all(entity)
+
+    def find_by(self, entity, field, value):
+        raise NotImplementedError
+
+    def count(self, entity):
+        raise NotImplementedError
+
+    def total(self, entity, field):
+        raise NotImplementedError
+
+    def aggregates(self, entity):
+        # Running Aggregates of the whole entity
+        raise NotImplementedError
+
+    def eligibility(self):
+        # EligibilityIndex over blood_donations, kept up to date on every change
+        raise NotImplementedError
+
+    def set_deferral(self, days):
+        # Changes the deferral period for this session; an eligibility index built later,
+        # e.g. after another process changed the SQLite database, starts with it too
+        self.deferral_days = days
+        index = self.eligibility()
+        with self.lock:
+            index.set_deferral(days)
+
+    @synchronized
+    def eligible_donors(self, blood_group, on=None, limit=None):
+        return self.eligibility().eligible(blood_group, on, limit)
+
+    @synchronized
+    def compatible_donors(self, recipient_group, on=None, limit=None):
+        return self.eligibility().compatible(recipient_group, on, limit)
+
+    @synchronized
+    def donor_status(self, name):
+        return self.eligibility().donor_status(name)
+
+    def donors(self):
+        # DonorIndex over members, donations and blood donations, kept up to date on every change
+        raise NotImplementedError
+
+    @synchronized
+    def donor_history(self, name):
+        # [(entity, record)] of every donation by the donor called name, oldest first
+        history = [(entity, self.get(entity, record_id)) for entity, record_id in self.donors().history(name)]
+        history = [(entity, record) for entity, record in history if record is not None]
+        history.sort(key=lambda item: (item[1].get(DATE_FIELDS[item[0]]) or "", item[0], item[1]["id"]))
+        return history
+
+    @synchronized
+    def donor_member(self, name):
+        # The member a donor name links to, or None
+        member_id = self.donors().member_for(name)
+        return self.get("members", member_id) if member_id is not None else None
+
+    @synchronized
+    def donor_keys(self):
+        # Normalized names of every donor and member, and of the members alone
+        index = self.donors()
+        return index.keys(), set(index.members)
+
+    def authenticate(self, username, password):
+        raise NotImplementedError
+
+    def export_data(self):
+        # Whole database in the DATABASE_FILE layout, used for backups
+        data = {entity: [dict(record) for record in self.all(entity)] for entity in ENTITIES}
+        data["users"] = self.users()
+        return data
+
+    def users(self):
+        raise NotImplementedError
+
+    def needs_checkpoint(self):
+        return False
+
+    def checkpoint(self):
+        return True
+
+    def sync(self):
+        # Picks up changes other processes made to the same database; returns the entities they changed
+        return set()
+
+    def start_writer(self, on_saved=None):
+        # Starts a CheckpointWriter when this backend benefits from one; on_saved(ok) runs on its thread
+        return None
+
+    def build_indexes(self):
+        # Builds the indexes that are slow to build, so the first search or eligible donors
+        # query does not wait for them
+        pass
+
+    def start_index_builder(self):
+        # Runs build_indexes on a background thread, e.g. right after loading
+        thread = threading.Thread(target=self.build_indexes, name="index-builder", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        pass
+
+class JsonStorage(Storage):
+    # Keeps the whole database in memory, persisted to DATABASE_FILE plus the journal
+
+    def __init__(self, database_file=DATABASE_FILE, journal_file=JOURNAL_FILE, mode=STORAGE_MODE,
+                 snapshot_file=SNAPSHOT_FILE, lock_file=LOCK_FILE):
+        self.database_file = database_file
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.mode = mode
+        self.lock = threading.RLock()
+        # Other processes may use the same files. Every change is journaled under the file lock,
+        # after reading what the others journaled, so ids and sequence numbers never clash.
+        self.file_lock = FileLock(lock_file)
+        data = None
+        if snapshot_file:
+            data = read_snapshot_file(snapshot_file, database_file, ENTITIES)
+        if data is None:
+            data = read_snapshot(database_file)
+        self.collections = load_collections(data)
+        self.user_table = data.get("users", dict(default_data["users"]))
+        # Sequence number of the last change applied here, and where reading the journal stopped:
+        # its header base and byte offset
+        self.journal_seq = data.get("journal_seq", 0)
+        self.journal_base = None
+        self.journal_offset = 0
+        # Number of records currently in the journal
+        self.journal_size = 0
+        # Entities changed by other processes that sync() has not reported yet
+        self.external_changes = set()
+        with self.file_lock:
+            self._catch_up()
+        self.external_changes.clear()
+        # Search and lookup indexes, built the first time they are needed
+        self.lookup_indexes = {}
+        self.aggregate_indexes = {}
+        self.date_indexes = {}
+        self.donor_index = None
+        # Search indexes and the eligibility index, which take long to build, so they are built
+        # without holding the lock throughout; see _index
+        self.built_indexes = {}
+        self.index_builds = set()
+        self.index_built = threading.Condition(self.lock)
+        # A checkpoint failed and has to be repeated
+        self.dirty = False
+        self.writer = None
+        # Numbers the temporary files of overlapping checkpoints
+        self.checkpoint_generation = 0
+
+    def _apply(self, entry):
+        self.collections[entry["entity"]].apply(entry)
+
+    def _catch_up(self):
+        # Applies the changes other processes journaled since the last call; needs the file lock.
+        # The journal is read even when its source_stamp has not changed: a checkpoint can replace
+        # it with a file of the same size that gets the same inode and, within one clock tick, the
+        # same mtime. Its header base tells the files apart.
+        try:
+            size = os.path.getsize(self.journal_file)
+        except OSError:
+            size = None
+        if self.journal_base is not None:
+            base, entries, offset = read_journal(self.journal_file, self.journal_offset, self.journal_seq)
+        if self.journal_base is None or base != self.journal_base or size is None or size < self.journal_offset:
+            # A checkpoint rewrote the journal: read it from the start. When the changes
+            # before its base never reached us, they are taken from DATABASE_FILE.
+            base, entries, offset = read_journal(self.journal_file)
+            if base > self.journal_seq:
+                self._merge_database()
+            self.journal_size = len(entries)
+            entries = [entry for entry in entries if entry["seq"] > self.journal_seq]
+        else:
+            self.journal_size += len(entries)
+        for entry in entries:
+            self._apply(entry)
+            self.external_changes.add(entry["entity"])
+            self.journal_seq = entry["seq"]
+        self.journal_base = base
+        self.journal_offset = offset
+
+    def _merge_database(self):
+        # Brings the collections level with DATABASE_FILE one record at a time, so only
+        # records that differ touch the indexes
+        data = read_snapshot(self.database_file)
+        sequences = data.get("sequences", {})
+        for entity, collection in self.collections.items():
+            stored = {record["id"]: record for record in data.get(entity, [])}
+            changed = False
+            for record_id in [record["id"] for record in collection if record["id"] not in stored]:
+                collection.remove(record_id)
+                changed = True
+            for record_id, record in stored.items():
+                current = collection.get(record_id)
+                if current is None:
+                    collection.add(record)
+                    changed = True
+                elif current != record:
+                    collection.update(record_id, record)
+                    changed = True
+            collection.next_id = max(collection.next_id, sequences.get(entity) or 1)
+            if changed:
+                self.external_changes.add(entity)
+        self.user_table = data.get("users", self.user_table)
+        self.journal_seq = data.get("journal_seq", 0)
+
+    def _append(self, op, entity, records):
+        # Journals records as the next sequence numbers; needs the file lock
+        seq = self.journal_seq
+        lines = []
+        if self.journal_offset == 0:
+            lines.append(journal_header(seq))
+        for record in records:
+            seq += 1
+            lines.append(journal_entry(op, entity, record, seq))
+        data = "".join(lines).encode("utf-8")
+        try:
+            with open(self.journal_file, "ab") as f:
+                # Drop a torn tail left by a crash so the new entries start on a line of their own
+                if f.tell() != self.journal_offset:
+                    f.truncate(self.journal_offset)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except IOError:
+            return False
+        if self.journal_offset == 0:
+            self.journal_base = self.journal_seq
+        self.journal_offset += len(data)
+        self.journal_seq = seq
+        self.journal_size += len(records)
+        return True
+
+    def _log(self, op, entity, record):
+        self._log_many(op, entity, [record])
+
+    def _log_many(self, op, entity, records):
+        # Every change is journaled, so other processes can pick it up; in snapshot mode
+        # DATABASE_FILE is rewritten right after. With a writer running, that is left to it.
+        if not self._append(op, entity, records):
+            raise StorageError("Error saving data")
+        if self.mode != "journal" or self.journal_size >= COMPACT_EVERY:
+            if self.writer:
+                self.writer.mark_dirty()
+            else:
+                # The change is safe in the journal even when this fails
+                self.checkpoint()
+
+    def sync(self):
+        # Picks up the changes of other processes; returns the entities they changed.
+        # The GUI calls it on a timer, so it gives up for now rather than wait when another
+        # thread holds the lock or another process holds the file lock.
+        if not self.lock.acquire(blocking=False):
+            return set()
+        try:
+            if not self.file_lock.acquire(blocking=False):
+                return set()
+            try:
+                self._catch_up()
+            finally:
+                self.file_lock.release()
+            changed = self.external_changes
+            self.external_changes = set()
+            return changed
+        finally:
+            self.lock.release()
+
+    @synchronized
+    def all(self, entity):
+        return self.collections[entity].view()
+
+    @synchronized
+    def get(self, entity, record_id):
+        return self.collections[entity].get(record_id)
+
+    @synchronized
+    def insert(self, entity, record):
+        with self.file_lock:
+            self._catch_up()
+            collection = self.collections[entity]
+            record = collection.add({"id": collection.allocate_id(), **record})
+            self._log("put", entity, record)
+        return record
+
+    @synchronized
+    def insert_many(self, entity, records):
+        with self.file_lock:
+            self._catch_up()
+            collection = self.collections[entity]
+            added = [collection.add({"id": collection.allocate_id(), **record}) for record in records]
+            if added:
+                try:
+                    self._log_many("put", entity, added)
+                except StorageError:
+                    for record in added:
+                        collection.remove(record["id"])
+                    raise
+        return added
+
+    @synchronized
+    def update(self, entity, record_id, fields):
+        with self.file_lock:
+            self._catch_up()
+            record = self.collections[entity].update(record_id, fields)
+            if record is not None:
+                self._log("put", entity, record)
+        return record
+
+    @synchronized
+    def update_many(self, entity, changes):
+        with self.file_lock:
+            self._catch_up()
+            collection = self.collections[entity]
+            old = {}
+            updated = []
+            for record_id, fields in changes.items():
+                record = collection.get(record_id)
+                if record is not None:
+                    old[record_id] = dict(record)
+                    updated.append(collection.update(record_id, fields))
+            if updated:
+                try:
+                    self._log_many("put", entity, updated)
+                except StorageError:
+                    for record_id, record in old.items():
+                        collection.update(record_id, record)
+                    raise
+        return updated
+
+    @synchronized
+    def delete(self, entity, record_id):
+        with self.file_lock:
+            self._catch_up()
+            record = self.collections[entity].remove(record_id)
+            if record is not None:
+                self._log("delete", entity, record)
+        return record
+
+    def _index(self, key, entity, create):
+        # The index stored under key, first built from the records of entity if needed.
+        # The build takes the lock for INDEX_BUILD_CHUNK records at a time, so the GUI can
+        # use the store meanwhile; other threads that want the index wait for it.
+        with self.lock:
+            while key in self.index_builds:
+                self.index_built.wait()
+            index = self.built_indexes.get(key)
+            if index is not None:
+                return index
+            collection = self.collections[entity]
+            index = create()
+            build = IndexBuild(index, collection.record_ids())
+            collection.indexes.append(build)
+            self.index_builds.add(key)
+        built = False
+        try:
+            for start in range(0, len(build.ids), INDEX_BUILD_CHUNK):
+                with self.lock:
+                    build.fill(collection, build.ids[start:start + INDEX_BUILD_CHUNK])
+            built = True
+        finally:
+            with self.lock:
+                position = collection.indexes.index(build)
+                if built:
+                    collection.indexes[position] = index
+                    self.built_indexes[key] = index
+                else:
+                    del collection.indexes[position]
+                self.index_builds.discard(key)
+                self.index_built.notify_all()
+        return index
+
+    def _search_index(self, entity):
+        return self._index(("search", entity), entity, lambda: NGramIndex(SEARCH_FIELDS[entity]))
+
+    def search(self, entity, query):
+        index = self._search_index(entity)
+        with self.lock:
+            collection = self.collections[entity]
+            return [collection.get(record_id) for record_id in index.search(query.lower())]
+
+    def _date_index(self, entity):
+        index = self.date_indexes.get(entity)
+        if index is None:
+            index = DateIndex(DATE_FIELDS[entity], AGGREGATE_FIELDS.get(entity, {}).get("amount_field"))
+            self.collections[entity].add_index(index)
+            self.date_indexes[entity] = index
+        return index
+
+    @synchronized
+    def date_range(self, entity, date_from=None, date_to=None):
+        collection = self.collections[entity]
+        return [collection.get(record_id) for record_id in self._date_index(entity).search(date_from, date_to)]
+
+    @synchronized
+    def range_total(self, entity, date_from=None, date_to=None):
+        return self._date_index(entity).total(date_from, date_to)
+
+    @synchronized
+    def find_by(self, entity, field, value):
+        collection = self.collections[entity]
+        normalize = LOOKUP_FIELDS.get(entity, {}).get(field)
+        if normalize is None:
+            for record in collection:
+                if record.get(field) == value:
+                    return record
+            return None
+        index = self.lookup_indexes.get((entity, field))
+        if index is None:
+            index = UniqueIndex(field, normalize)
+            collection.add_index(index)
+            self.lookup_indexes[(entity, field)] = index
+        record_id = index.lookup(value)
+        return collection.get(record_id) if record_id is not None else None
+
+    def count(self, entity):
+        return len(self.collections[entity])
+
+    @synchronized
+    def total(self, entity, field):
+        if AGGREGATE_FIELDS.get(entity, {}).get("amount_field") == field:
+            return self.aggregates(entity).total
+        return sum(record[field] for record in self.collections[entity])
+
+    @synchronized
+    def aggregates(self, entity):
+        aggregates = self.aggregate_indexes.get(entity)
+        if aggregates is None:
+            aggregates = Aggregates(**AGGREGATE_FIELDS.get(entity, {}))
+            self.collections[entity].add_index(aggregates)
+            self.aggregate_indexes[entity] = aggregates
+        return aggregates
+
+    def eligibility(self):
+        return self._index(("eligibility",), "blood_donations", lambda: EligibilityIndex(self.deferral_days))
+
+    def build_indexes(self):
+        for entity in ENTITIES:
+            self._search_index(entity)
+        self.eligibility()
+
+    @synchronized
+    def donors(self):
+        if self.donor_index is None:
+            index = DonorIndex()
+            for entity in ("members",) + tuple(DONOR_FIELDS):
+                self.collections[entity].add_index(index.hook(entity))
+            self.donor_index = index
+        return self.donor_index
+
+    def authenticate(self, username, password):
+        return username in self.user_table and self.user_table[username] == password
+
+    def users(self):
+        return dict(self.user_table)
+
+    @synchronized
+    def export_data(self):
+        data = {entity: [dict(record) for record in collection.view()]
+                for entity, collection in self.collections.items()}
+        data["users"] = dict(self.user_table)
+        data["sequences"] = {entity: collection.next_id for entity, collection in self.collections.items()}
+        return data
+
+    def needs_checkpoint(self):
+        return self.dirty or self.journal_size > 0
+
+    @timed("checkpoint")
+    def checkpoint(self):
+        # The data is copied under the locks but written outside them, so changes, here and in
+        # other processes, can go on meanwhile
+        with self.lock:
+            with self.file_lock:
+                self._catch_up()
+                data = self.export_data()
+            seq = data["journal_seq"] = self.journal_seq
+            self.checkpoint_generation += 1
+            generation = self.checkpoint_generation
+            self.dirty = False
+        temp_file = f"{self.database_file}.{os.getpid()}.{generation}.tmp"
+        if not write_json_file(data, temp_file):
+            with self.lock:
+                self.dirty = True
+            return False
+        with self.lock, self.file_lock:
+            base, entries, offset = read_journal(self.journal_file)
+            if base >= seq and os.path.exists(self.database_file):
+                # A newer checkpoint, here or in another process, finished first
+                os.remove(temp_file)
+                return True
+            try:
+                os.replace(temp_file, self.database_file)
+            except IOError:
+                os.remove(temp_file)
+                self.dirty = True
+                return False
+            source = source_stamp(self.database_file)
+            # Journal entries that are now part of the snapshot are dropped
+            self._trim_journal(seq, entries)
+        # The binary copy is optional: if it fails or falls behind, startup reads the JSON file
+        if self.snapshot_file:
+            write_snapshot(data, self.snapshot_file, source, ENTITIES, f"{self.snapshot_file}.{os.getpid()}.{generation}.tmp")
+        return True
+
+    def _trim_journal(self, base, entries):
+        # Rewrites the journal with the entries after base; needs the file lock.
+        # If that fails the old journal stays, and entries up to base are skipped when read.
+        entries = [entry for entry in entries if entry["seq"] > base]
+        lines = write_journal(self.journal_file, base, entries)
+        if lines is None:
+            return
+        offset = len(lines[0])
+        size = 0
+        for entry, line in zip(entries, lines[1:]):
+            # Entries up to journal_seq are applied here already; the rest are read by the next
+            # _catch_up(), which counts them
+            if entry["seq"] <= self.journal_seq:
+                offset += len(line.encode("utf-8"))
+                size += 1
+        self.journal_base = base
+        self.journal_offset = offset
+        self.journal_size = size
+
+    def start_writer(self, on_saved=None):
+        if self.writer is None:
+            self.writer = CheckpointWriter(self, on_saved=on_saved)
+        return self.writer
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+class CheckpointWriter:
+    # Saves a JsonStorage on a background thread. Changes only mark it dirty, and a burst of
+    # changes is written once, COALESCE_DELAY seconds after the last of them.
+
+    def __init__(self, storage, delay=COALESCE_DELAY, max_delay=COALESCE_MAX_DELAY, on_saved=None):
+        self.storage = storage
+        self.delay = delay
+        self.max_delay = max_delay
+        self.on_saved = on_saved
+        self._dirty = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    def close(self):
+        # Stops the thread and saves whatever is still unsaved
+        self._closing.set()
+        self._dirty.set()
+        self._thread.join()
+        if self.storage.needs_checkpoint():
+            self.storage.checkpoint()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            if self._closing.is_set():
+                return
+            started = time.monotonic()
+            # Wait until changes stop coming in
+            while True:
+                self._dirty.clear()
+                if self._closing.wait(self.delay):
+                    return
+                if not self._dirty.is_set() or time.monotonic() - started >= self.max_delay:
+                    break
+            self._dirty.clear()
+            saved = self.storage.checkpoint()
+            if self.on_saved:
+                self.on_saved(saved)
+
+def phone_digits(phone):
+    # Value of the members.phone_digits column for a phone number
+    return normalize_phone(str(phone)) if phone is not None else None
+
+def record_columns(entity):
+    # The entity's own columns, without the ones SQLite keeps for lookups only
+    return ", ".join(("id",) + COLUMNS[entity])
+
+def finite_column(column):
+    # SQL for column, NULL where it holds an infinite amount from before amounts were checked.
+    # inf - inf is NaN, which SQLite turns into NULL, as it does with a stored NaN.
+    return f"CASE WHEN {column} - {column} = 0 THEN {column} END"
+
+class SqliteRows:
+    # Read-only sequence of records backed by a list of ids; rows are fetched in pages on access
+    PAGE_SIZE = 500
+
+    def __init__(self, storage, entity, ids):
+        self.storage = storage
+        self.entity = entity
+        self.ids = ids
+        self._page_start = None
+        self._page = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.ids)))]
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        page_start = index - index % self.PAGE_SIZE
+        if page_start != self._page_start:
+            self._page = self.storage._fetch(self.entity, self.ids[page_start:page_start + self.PAGE_SIZE])
+            self._page_start = page_start
+        return self._page[index - page_start]
+
+    def __iter__(self):
+        for page_start in range(0, len(self.ids), self.PAGE_SIZE):
+            yield from self.storage._fetch(self.entity, self.ids[page_start:page_start + self.PAGE_SIZE])
+
+    def copy(self):
+        # The ids never change; the copy gets its own page
+        return SqliteRows(self.storage, self.entity, self.ids)
+
+class SqliteStorage(Storage):
+    # Stores each entity in an indexed SQLite table; only the rows being looked at are loaded
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS members (
+            id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT, address TEXT, password TEXT,
+            phone_digits TEXT);
+        DROP INDEX IF EXISTS members_email;
+        CREATE INDEX IF NOT EXISTS members_email_nocase ON members(email COLLATE NOCASE);
+        DROP INDEX IF EXISTS members_phone;
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY, name TEXT, date TEXT, location TEXT, description TEXT);
+        CREATE INDEX IF NOT EXISTS events_date ON events(date);
+        CREATE TABLE IF NOT EXISTS donations (
+            id INTEGER PRIMARY KEY, donor_name TEXT, amount REAL, date TEXT);
+        CREATE INDEX IF NOT EXISTS donations_date ON donations(date);
+        CREATE INDEX IF NOT EXISTS donations_donor ON donations(donor_name);
+        CREATE TABLE IF NOT EXISTS blood_donations (
+            id INTEGER PRIMARY KEY, donor_name TEXT, blood_group TEXT, donation_date TEXT);
+        CREATE INDEX IF NOT EXISTS blood_donations_group ON blood_donations(blood_group, donation_date);
+        CREATE INDEX IF NOT EXISTS blood_donations_donor ON blood_donations(donor_name);
+        CREATE INDEX IF NOT EXISTS blood_donations_date ON blood_donations(donation_date);
+        CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT);
+    """
+
+    def __init__(self, sqlite_file=SQLITE_FILE):
+        self.sqlite_file = sqlite_file
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(sqlite_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(self.SCHEMA)
+            # phone_digits holds the digits of each member's phone, so phone lookups match the
+            # way the JSON backend's index does. Older databases get it filled in here.
+            if "phone_digits" not in [row["name"] for row in self.conn.execute("PRAGMA table_info(members)")]:
+                self.conn.execute("ALTER TABLE members ADD COLUMN phone_digits TEXT")
+                self._fill_phone_digits()
+            self.conn.execute("CREATE INDEX IF NOT EXISTS members_phone_digits ON members(phone_digits)")
+            if self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+                self.conn.executemany("INSERT INTO users VALUES (?, ?)", default_data["users"].items())
+        # Running aggregates and the eligibility index, seeded from the tables the first time they are needed
+        self.aggregate_indexes = {}
+        self.eligibility_index = None
+        self.donor_index = None
+        self.donor_hooks = {}
+        # PRAGMA data_version changes when another connection, e.g. another app window, commits.
+        # The cached indexes are dropped then, and sync() reports it.
+        self.data_version = self._data_version()
+        self.synced_version = self.data_version
+
+    def _data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _fill_phone_digits(self):
+        rows = self.conn.execute("SELECT id, phone FROM members WHERE phone_digits IS NULL").fetchall()
+        self.conn.executemany("UPDATE members SET phone_digits = ? WHERE id = ?",
+                              [(phone_digits(phone), record_id) for record_id, phone in rows])
+
+    def _columns(self, entity, fields):
+        # Columns to write for fields and their values; a member's phone also sets phone_digits
+        columns = [column for column in COLUMNS[entity] if column in fields]
+        values = [fields[column] for column in columns]
+        if entity == "members" and "phone" in fields:
+            columns.append("phone_digits")
+            values.append(phone_digits(fields["phone"]))
+        return columns, values
+
+    def _check_version(self):
+        version = self._data_version()
+        if version != self.data_version:
+            self.data_version = version
+            self.aggregate_indexes = {}
+            self.eligibility_index = None
+            self.donor_index = None
+            self.donor_hooks = {}
+        return version
+
+    def sync(self):
+        # Which rows changed is not known, so every entity is reported.
+        # Gives up for now when another thread holds the lock, like JsonStorage.sync.
+        if not self.lock.acquire(blocking=False):
+            return set()
+        try:
+            version = self._check_version()
+            if version == self.synced_version:
+                return set()
+            self.synced_version = version
+            return set(ENTITIES)
+        finally:
+            self.lock.release()
+
+    def _track(self, entity, old=None, new=None):
+        indexes = [self.aggregate_indexes.get(entity), self.donor_hooks.get(entity)]
+        if entity == "blood_donations":
+            indexes.append(self.eligibility_index)
+        for index in indexes:
+            if index is not None:
+                if old is not None:
+                    index.remove(old)
+                if new is not None:
+                    index.add(new)
+
+    @synchronized
+    def _fetch(self, entity, ids):
+        # Rows for ids, returned in the order of ids
+        rows = {}
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self.conn.execute(
+                    f"SELECT {record_columns(entity)} FROM {entity} WHERE id IN ({placeholders})", chunk):
+                rows[row["id"]] = dict(row)
+        return [rows[record_id] for record_id in ids if record_id in rows]
+
+    @synchronized
+    def _ids(self, sql, params=()):
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def all(self, entity):
+        return SqliteRows(self, entity, self._ids(f"SELECT id FROM {entity} ORDER BY id"))
+
+    @synchronized
+    def get(self, entity, record_id):
+        row = self.conn.execute(f"SELECT {record_columns(entity)} FROM {entity} WHERE id = ?", (record_id,)).fetchone()
+        return dict(row) if row else None
+
+    @synchronized
+    def insert(self, entity, record):
+        columns, values = self._columns(entity, {column: record.get(column) for column in COLUMNS[entity]})
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    f"INSERT INTO {entity} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values)
+        except sqlite3.Error as e:
+            raise StorageError(str(e))
+        record = self.get(entity, cursor.lastrowid)
+        self._track(entity, new=record)
+        return record
+
+    @synchronized
+    def insert_many(self, entity, records):
+        columns, _ = self._columns(entity, dict.fromkeys(COLUMNS[entity]))
+        sql = f"INSERT INTO {entity} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        ids = []
+        try:
+            with self.conn:
+                for record in records:
+                    _, values = self._columns(entity, {column: record.get(column) for column in COLUMNS[entity]})
+                    ids.append(self.conn.execute(sql, values).lastrowid)
+        except sqlite3.Error as e:
+            raise StorageError(str(e))
+        added = self._fetch(entity, ids)
+        for record in added:
+            self._track(entity, new=record)
+        return added
+
+    @synchronized
+    def update(self, entity, record_id, fields):
+        old = self.get(entity, record_id)
+        if old is None:
+            return None
+        columns, values = self._columns(entity, fields)
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    f"UPDATE {entity} SET {', '.join(column + ' = ?' for column in columns)} WHERE id = ?",
+                    values + [record_id])
+        except sqlite3.Error as e:
+            raise StorageError(str(e))
+        if cursor.rowcount == 0:
+            return None
+        record = self.get(entity, record_id)
+        self._track(entity, old=old, new=record)
+        return record
+
+    @synchronized
+    def update_many(self, entity, changes):
+        old = {record["id"]: record for record in self._fetch(entity, list(changes))}
+        try:
+            with self.conn:
+                for record_id, fields in changes.items():
+                    columns, values = self._columns(entity, fields)
+                    if record_id in old and columns:
+                        self.conn.execute(
+                            f"UPDATE {entity} SET {', '.join(column + ' = ?' for column in columns)} WHERE id = ?",
+                            values + [record_id])
+        except sqlite3.Error as e:
+            raise StorageError(str(e))
+        updated = self._fetch(entity, list(old))
+        for record in updated:
+            self._track(entity, old=old[record["id"]], new=record)
+        return updated
+
+    @synchronized
+    def delete(self, entity, record_id):
+        record = self.get(entity, record_id)
+        if record is None:
+            return None
+        try:
+            with self.conn:
+                self.conn.execute(f"DELETE FROM {entity} WHERE id = ?", (record_id,))
+        except sqlite3.Error as e:
+            raise StorageError(str(e))
+        self._track(entity, old=record)
+        return record
+
+    def search(self, entity, query):
+        query = query.lower()
+        condition = " OR ".join(f"instr(lower(CAST({field} AS TEXT)), ?) > 0" for field in SEARCH_FIELDS[entity])
+        params = [query] * len(SEARCH_FIELDS[entity])
+        return SqliteRows(self, entity, self._ids(f"SELECT id FROM {entity} WHERE {condition} ORDER BY id", params))
+
+    def _date_condition(self, entity, date_from, date_to):
+        field = DATE_FIELDS[entity]
+        conditions = [f"{field} > ''"]
+        params = []
+        if date_from:
+            conditions.append(f"{field} >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"{field} <= ?")
+            params.append(date_to)
+        return " AND ".join(conditions), params
+
+    def date_range(self, entity, date_from=None, date_to=None):
+        condition, params = self._date_condition(entity, date_from, date_to)
+        return SqliteRows(self, entity, self._ids(
+            f"SELECT id FROM {entity} WHERE {condition} ORDER BY {DATE_FIELDS[entity]}, id", params))
+
+    @synchronized
+    def range_total(self, entity, date_from=None, date_to=None):
+        condition, params = self._date_condition(entity, date_from, date_to)
+        field = AGGREGATE_FIELDS[entity]["amount_field"]
+        return self.conn.execute(
+            f"SELECT COALESCE(SUM({finite_column(field)}), 0) FROM {entity} WHERE {condition}", params).fetchone()[0]
+
+    @synchronized
+    def find_by(self, entity, field, value):
+        if field not in COLUMNS[entity] and field != "id":
+            raise KeyError(field)
+        if field == "email":
+            # Matches the case-insensitive members_email_nocase index
+            sql = f"SELECT {record_columns(entity)} FROM {entity} WHERE {field} = ? COLLATE NOCASE ORDER BY id LIMIT 1"
+            value = value.strip()
+        elif field == "phone":
+            # Only the digits count, as in the JSON backend
+            sql = f"SELECT {record_columns(entity)} FROM {entity} WHERE phone_digits = ? ORDER BY id LIMIT 1"
+            value = phone_digits(value)
+        else:
+            sql = f"SELECT {record_columns(entity)} FROM {entity} WHERE {field} = ? ORDER BY id LIMIT 1"
+        row = self.conn.execute(sql, (value,)).fetchone()
+        return dict(row) if row else None
+
+    @synchronized
+    def count(self, entity):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {entity}").fetchone()[0]
+
+    @synchronized
+    def total(self, entity, field):
+        if AGGREGATE_FIELDS.get(entity, {}).get("amount_field") == field:
+            return self.aggregates(entity).total
+        if field not in COLUMNS[entity]:
+            raise KeyError(field)
+        return self.conn.execute(f"SELECT COALESCE(SUM({field}), 0) FROM {entity}").fetchone()[0]
+
+    @synchronized
+    def aggregates(self, entity):
+        self._check_version()
+        aggregates = self.aggregate_indexes.get(entity)
+        if aggregates is None:
+            fields = AGGREGATE_FIELDS.get(entity, {})
+            aggregates = Aggregates(**fields)
+            amount = fields.get("amount_field")
+            date = fields.get("date_field")
+            group = fields.get("group_field")
+            sql = (f"SELECT COUNT(*), {f'SUM({finite_column(amount)})' if amount else '0'}, "
+                   f"{f'substr({date}, 1, 7)' if date else 'NULL'}, {group or 'NULL'} "
+                   f"FROM {entity} GROUP BY 3, 4")
+            for count, total, month, group_value in self.conn.execute(sql):
+                aggregates.add_bucket(
+                    count, Decimal(str(total or 0)),
+                    (month or "") if date else None,
+                    (group_value or "") if group else None)
+            self.aggregate_indexes[entity] = aggregates
+        return aggregates
+
+    @synchronized
+    def eligibility(self):
+        self._check_version()
+        if self.eligibility_index is None:
+            index = EligibilityIndex(self.deferral_days)
+            index.add_many(dict(row) for row in self.conn.execute("SELECT * FROM blood_donations"))
+            self.eligibility_index = index
+        return self.eligibility_index
+
+    def build_indexes(self):
+        # Searches run in SQL, so only the eligibility index is worth building ahead
+        self.eligibility()
+
+    @synchronized
+    def donors(self):
+        self._check_version()
+        if self.donor_index is None:
+            index = DonorIndex()
+            for entity in ("members",) + tuple(DONOR_FIELDS):
+                hook = index.hook(entity)
+                for row in self.conn.execute(f"SELECT id, {hook.field} FROM {entity}"):
+                    hook.add(dict(row))
+                self.donor_hooks[entity] = hook
+            self.donor_index = index
+        return self.donor_index
+
+    @synchronized
+    def authenticate(self, username, password):
+        row = self.conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None and row[0] == password
+
+    @synchronized
+    def users(self):
+        return {row[0]: row[1] for row in self.conn.execute("SELECT username, password FROM users")}
+
+    @synchronized
+    def close(self):
+        self.conn.close()
+
+def migrate_json_to_sqlite(database_file=DATABASE_FILE, journal_file=JOURNAL_FILE, sqlite_file=SQLITE_FILE):
+    # One-shot copy of the JSON database (including journaled changes) into a new SQLite database
+    data = load_database(database_file, journal_file)
+    storage = SqliteStorage(sqlite_file)
+    with storage.conn:
+        for entity in ENTITIES:
+            columns = ("id",) + COLUMNS[entity]
+            storage.conn.executemany(
+                f"INSERT OR REPLACE INTO {entity} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                ([record.get(column) for column in columns] for record in data.get(entity, [])))
+        storage._fill_phone_digits()
+        storage.conn.executemany("INSERT OR REPLACE INTO users VALUES (?, ?)", data.get("users", {}).items())
+    return storage
+
+@timed("open_storage")
+def open_storage(backend=None):
+    backend = backend or STORAGE_BACKEND
+    if backend == "sqlite":
+        # First start on SQLite: bring over the existing JSON database
+        if not os.path.exists(SQLITE_FILE) and (os.path.exists(DATABASE_FILE) or os.path.exists(JOURNAL_FILE)):
+            return migrate_json_to_sqlite()
+        return SqliteStorage()
+    return JsonStorage()
@@ -0,0 +1,173 @@
+import queue
+import threading
+
+from perf import recorder
+
+def count_rows(result):
+    # Searches return their rows, or the rows and their aggregates
+    if isinstance(result, tuple):
+        result = result[0]
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+class SearchScheduler:
+    # Runs searches on a worker thread once typing pauses.
+    # Each search has a key (one per tab); a newer search for the same key cancels the older one,
+    # and only the newest result is handed back to the Tk thread.
+    DEBOUNCE_MS = 250
+    POLL_MS = 20
+
+    def __init__(self, root, delay=DEBOUNCE_MS, on_error=None):
+        self.root = root
+        self.delay = delay
+        self.on_error = on_error
+        self._timers = {}
+        self._generations = {}
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._outstanding = 0
+        self._polling = False
+        self._worker = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self._worker.start()
+
+    def schedule(self, key, search, apply):
+        # search runs on the worker thread, apply(result) runs on the Tk thread
+        self._cancel_timer(key)
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        self._timers[key] = self.root.after(self.delay, self._submit, key, generation, search, apply)
+
+    def cancel(self, key):
+        # Forget any pending or running search for key
+        self._cancel_timer(key)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _cancel_timer(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            self.root.after_cancel(timer)
+
+    def _is_current(self, key, generation):
+        return self._generations.get(key) == generation
+
+    def _submit(self, key, generation, search, apply):
+        self._timers.pop(key, None)
+        self._outstanding += 1
+        self._jobs.put((key, generation, search, apply))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _run(self):
+        while True:
+            key, generation, search, apply = self._jobs.get()
+            result = error = None
+            # Searches that were superseded while queued are skipped
+            if self._is_current(key, generation):
+                try:
+                    with recorder.timer(f"search_{key}") as timer:
+                        result = search()
+                        if recorder.enabled:
+                            timer.rows = count_rows(result)
+                except Exception as e:
+                    error = e
+            self._results.put((key, generation, apply, result, error))
+
+    def _poll(self):
+        while True:
+            try:
+                key, generation, apply, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._outstanding -= 1
+            if not self._is_current(key, generation):
+                continue
+            if error is not None:
+                if self.on_error:
+                    self.on_error(error)
+            else:
+                apply(result)
+        if self._outstanding:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+class BackgroundTask:
+    # Runs work(progress, cancelled) on a worker thread.
+    # work calls progress(...) to report; on_progress, on_done and on_error are called on the Tk thread.
+    POLL_MS = 100
+
+    def __init__(self, root, work, on_done=None, on_progress=None, on_error=None):
+        self.root = root
+        self.work = work
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self._cancel = threading.Event()
+        self._messages = queue.Queue()
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, name="background-task", daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        try:
+            result = self.work(self._report, self._cancel.is_set)
+            self._messages.put(("done", result))
+        except Exception as e:
+            self._messages.put(("error", e))
+
+    def _report(self, *args):
+        self._messages.put(("progress", args))
+
+    def _poll(self):
+        latest_progress = None
+        outcome = None
+        while True:
+            try:
+                kind, value = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                # Only the most recent progress report is worth drawing
+                latest_progress = value
+            else:
+                outcome = (kind, value)
+        if latest_progress is not None and self.on_progress and outcome is None:
+            self.on_progress(*latest_progress)
+        if outcome is None:
+            self.root.after(self.POLL_MS, self._poll)
+            return
+        self.finished = True
+        kind, value = outcome
+        if kind == "done":
+            if self.on_done:
+                self.on_done(value)
+        elif self.on_error:
+            self.on_error(value)
+
+class UiQueue:
+    # Lets other threads hand callbacks to the Tk thread; call() is safe from any thread
+    POLL_MS = 100
+
+    def __init__(self, root):
+        self.root = root
+        self._calls = queue.Queue()
+        self.root.after(self.POLL_MS, self._poll)
+
+    def call(self, func, *args):
+        self._calls.put((func, args))
+
+    def _poll(self):
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+        self.root.after(self.POLL_MS, self._poll)
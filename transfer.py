@@ -0,0 +1,200 @@
+import csv
+import json
+import math
+import os
+from datetime import datetime
+
+from indexes import normalize_blood_group, normalize_email
+from storage import COLUMNS, DATE_FIELDS
+
+# Columns offered for export, in file order; passwords are never exported
+EXPORT_COLUMNS = {
+    "members": ["id", "name", "email", "phone", "address"],
+    "events": ["id", "name", "date", "location", "description"],
+    "donations": ["id", "donor_name", "amount", "date"],
+    "blood_donations": ["id", "donor_name", "blood_group", "donation_date"],
+}
+
+# Rows written between progress reports and cancellation checks
+PROGRESS_EVERY = 1000
+
+# Fields that must not be empty, as required by the add forms
+REQUIRED_FIELDS = {
+    "members": ("name", "email", "phone", "address", "password"),
+    "events": ("name", "date", "location"),
+    "donations": ("donor_name", "amount", "date"),
+    "blood_donations": ("donor_name", "blood_group", "donation_date"),
+}
+
+# Records validated between progress reports and cancellation checks during an import
+IMPORT_BATCH = 1000
+
+# Errors kept per import; the rest are only counted
+MAX_IMPORT_ERRORS = 1000
+
+class TransferCancelled(Exception):
+    pass
+
+class ImportResult:
+    # Outcome of import_file. errors holds (row number, message) pairs; row 1 is the first data row.
+    def __init__(self):
+        self.checked = 0
+        self.imported = 0
+        self.invalid = 0
+        self.errors = []
+
+def validate_record(entity, fields):
+    # Checks one record the way the add forms do and returns it with only the entity's columns.
+    # Raises ValueError with the message to show the user.
+    record = {}
+    for column in COLUMNS[entity]:
+        value = fields.get(column)
+        record[column] = "" if value is None else str(value).strip()
+    if not all(record[field] for field in REQUIRED_FIELDS[entity]):
+        if entity == "events":
+            raise ValueError("Name, Date, and Location are required!")
+        raise ValueError("All fields are required!")
+    if entity == "donations":
+        try:
+            record["amount"] = float(record["amount"])
+        except ValueError:
+            raise ValueError("Amount must be a number")
+        # float() also takes "inf" and "nan"
+        if not math.isfinite(record["amount"]):
+            raise ValueError("Amount must be a number")
+    date_field = DATE_FIELDS.get(entity)
+    if date_field:
+        try:
+            datetime.strptime(record[date_field], "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("Invalid date format. Please use YYYY-MM-DD")
+    return record
+
+def filter_records(entity, records, date_from=None, date_to=None, blood_group=None):
+    # Generator over the records matching the filters; dates are "YYYY-MM-DD" strings, both ends inclusive
+    date_field = DATE_FIELDS.get(entity)
+    if blood_group and entity == "blood_donations":
+        blood_group = normalize_blood_group(blood_group)
+    else:
+        blood_group = None
+    for record in records:
+        if date_field and (date_from or date_to):
+            date = record.get(date_field) or ""
+            if date_from and date < date_from:
+                continue
+            if date_to and date > date_to:
+                continue
+        if blood_group and normalize_blood_group(record.get("blood_group") or "") != blood_group:
+            continue
+        yield record
+
+def write_csv(records, filename, columns, total=None, progress=None, cancelled=None):
+    # Streams records to filename and returns the number of rows written.
+    # The file is written under a temporary name and only appears once complete.
+    temp_file = filename + ".part"
+    count = 0
+    try:
+        with open(temp_file, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(columns)
+            for record in records:
+                writer.writerow([record.get(column, "") for column in columns])
+                count += 1
+                if count % PROGRESS_EVERY == 0:
+                    if cancelled and cancelled():
+                        raise TransferCancelled()
+                    if progress:
+                        progress(count, total)
+        os.replace(temp_file, filename)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    if progress:
+        progress(count, total)
+    return count
+
+def check_cancelled(records, cancelled):
+    # Passes records through, stopping with TransferCancelled once cancelled() is true
+    for count, record in enumerate(records, 1):
+        if count % PROGRESS_EVERY == 0 and cancelled():
+            raise TransferCancelled()
+        yield record
+
+def export_csv(storage, entity, filename, columns=None, date_from=None, date_to=None, blood_group=None,
+               progress=None, cancelled=None):
+    # Exports one entity to CSV without loading it all at once; safe to run off the Tk thread.
+    # progress(rows_written, total) is called periodically, total is None when filters apply.
+    columns = columns or EXPORT_COLUMNS[entity]
+    # The JSON storage changes its views in place as records are added and deleted, so the
+    # export reads a copy taken under the storage lock
+    with storage.lock:
+        records = storage.all(entity).copy()
+    filtered = bool(date_from or date_to or (blood_group and entity == "blood_donations"))
+    total = None if filtered else len(records)
+    if cancelled:
+        records = check_cancelled(records, cancelled)
+    rows = filter_records(entity, records, date_from, date_to, blood_group)
+    return write_csv(rows, filename, columns, total, progress, cancelled)
+
+def read_records(filename, entity):
+    # Yields the records of a CSV file (with a header row) or of a JSON file.
+    # JSON may be a list of records or a backup holding one list per entity.
+    if filename.lower().endswith(".json"):
+        with open(filename, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get(entity, [])
+        for record in data:
+            yield record if isinstance(record, dict) else {}
+        return
+    with open(filename, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+def import_file(storage, entity, filename, skip_invalid=False, progress=None, cancelled=None):
+    # Validates every record of filename and inserts the valid ones with a single storage write.
+    # Unless skip_invalid is set nothing is inserted when any record is invalid.
+    # progress(records_checked) is called after each batch; safe to run off the Tk thread.
+    result = ImportResult()
+    valid = []
+    # Member emails must be unique, both against stored members and within the file
+    seen_emails = set()
+
+    def check(batch, first_row):
+        for row, fields in enumerate(batch, first_row):
+            try:
+                record = validate_record(entity, fields)
+                if entity == "members":
+                    email = normalize_email(record["email"])
+                    if email in seen_emails or storage.find_by("members", "email", record["email"]):
+                        raise ValueError("Email already exists!")
+                    seen_emails.add(email)
+            except ValueError as e:
+                result.invalid += 1
+                if len(result.errors) < MAX_IMPORT_ERRORS:
+                    result.errors.append((row, str(e)))
+                continue
+            valid.append(record)
+
+    batch = []
+    for fields in read_records(filename, entity):
+        batch.append(fields)
+        if len(batch) == IMPORT_BATCH:
+            check(batch, result.checked + 1)
+            result.checked += len(batch)
+            batch = []
+            if cancelled and cancelled():
+                raise TransferCancelled()
+            if progress:
+                progress(result.checked)
+    check(batch, result.checked + 1)
+    result.checked += len(batch)
+    if progress:
+        progress(result.checked)
+
+    if result.invalid and not skip_invalid:
+        return result
+    if cancelled and cancelled():
+        raise TransferCancelled()
+    result.imported = len(storage.insert_many(entity, valid))
+    return result
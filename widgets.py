@@ -0,0 +1,191 @@
+from tkinter import ttk
+
+class VirtualTreeview:
+    # Treeview for large lists: only the rows in view (plus a small buffer) exist as Treeview items.
+    # The scrollbar is driven from the position in the row list instead of the Treeview's own items.
+    BUFFER = 5
+    ROW_HEIGHT = 20
+    HEADING_HEIGHT = 25
+
+    def __init__(self, parent, columns, format_row, key=None):
+        self.format_row = format_row
+        # Treeview iid of a record; by default its first value, which must then be unique
+        self.key = key
+        self.rows = []
+        self.offset = 0
+        self.visible_count = 20
+        self._selected_key = None
+        self._selected_values = None
+        self._select_callbacks = []
+        # Rows currently materialized, by iid, and their order in the Treeview
+        self._shown = {}
+        self._order = []
+
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=100, anchor="w")
+        self.tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        try:
+            self.row_height = int(ttk.Style().lookup("Treeview", "rowheight")) or self.ROW_HEIGHT
+        except (ValueError, TypeError):
+            self.row_height = self.ROW_HEIGHT
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self._move_selection(-self.visible_count))
+        self.tree.bind("<Next>", lambda e: self._move_selection(self.visible_count))
+
+    # Treeview-compatible interface used by the tab handlers
+    def bind(self, sequence, func):
+        if sequence == "<<TreeviewSelect>>":
+            self._select_callbacks.append(func)
+        else:
+            self.tree.bind(sequence, func)
+
+    def selection(self):
+        # The selected row stays selected while it is scrolled out of view
+        if self._selected_key is None:
+            return ()
+        return (self._selected_key,)
+
+    def item(self, iid):
+        if isinstance(iid, (tuple, list)):
+            iid = iid[0]
+        if iid in self._shown:
+            return self.tree.item(iid)
+        if iid == self._selected_key:
+            return {"values": list(self._selected_values)}
+        raise KeyError(iid)
+
+    def clear_selection(self):
+        self._selected_key = None
+        self._selected_values = None
+        if self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+
+    # Data
+    def set_rows(self, rows):
+        # rows is any sequence of records supporting len() and slicing.
+        # The scroll position and selection are kept; only the visible rows that differ are redrawn.
+        self.rows = rows
+        self._render()
+
+    def scroll(self, delta):
+        self.scroll_to(self.offset + delta)
+        return "break"
+
+    def scroll_to(self, offset):
+        max_offset = max(0, len(self.rows) - self.visible_count)
+        offset = min(max(0, offset), max_offset)
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _render(self):
+        # Bring the Treeview items in line with the rows in view, keyed by record id.
+        # Only rows that appeared, disappeared, moved or changed touch the Treeview.
+        max_offset = max(0, len(self.rows) - self.visible_count)
+        self.offset = min(self.offset, max_offset)
+        window = self.rows[self.offset:self.offset + self.visible_count + self.BUFFER]
+        desired = []
+        for record in window:
+            values = self.format_row(record)
+            desired.append((self._key(record, values), values))
+
+        desired_keys = {iid for iid, values in desired}
+        removed = [iid for iid in self._order if iid not in desired_keys]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                del self._shown[iid]
+            self._order = [iid for iid in self._order if iid in desired_keys]
+
+        for index, (iid, values) in enumerate(desired):
+            if iid not in self._shown:
+                self.tree.insert("", index, iid=iid, values=values)
+                self._order.insert(index, iid)
+            else:
+                if self._shown[iid] != values:
+                    self.tree.item(iid, values=values)
+                if self._order[index] != iid:
+                    self.tree.move(iid, "", index)
+                    self._order.remove(iid)
+                    self._order.insert(index, iid)
+            self._shown[iid] = values
+
+        # Reselect the selected row when it scrolls back into view
+        if self._selected_key in self._shown:
+            self._selected_values = self._shown[self._selected_key]
+            if self.tree.selection() != (self._selected_key,):
+                self.tree.selection_set(self._selected_key)
+        self._update_scrollbar()
+
+    def _key(self, record, values):
+        return str(self.key(record)) if self.key else str(values[0])
+
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_count) / total))
+
+    # Events
+    def _on_tree_select(self, event):
+        selected = self.tree.selection()
+        if not selected:
+            # Selected rows are removed from the tree when they scroll out of view
+            return
+        key = selected[0]
+        if key == self._selected_key:
+            return
+        self._selected_key = key
+        self._selected_values = self.tree.item(key)["values"]
+        for callback in self._select_callbacks:
+            callback(event)
+
+    def _on_configure(self, event):
+        visible_count = max(1, (event.height - self.HEADING_HEIGHT) // self.row_height)
+        if visible_count != self.visible_count:
+            self.visible_count = visible_count
+            self._render()
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS reports small deltas
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-steps * 3)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        elif action == "scroll":
+            step = self.visible_count if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _move_selection(self, delta):
+        if not len(self.rows):
+            return "break"
+        index = self.offset
+        if self._selected_key in self._shown:
+            index = self.offset + self._order.index(self._selected_key) + delta
+        index = min(max(0, index), len(self.rows) - 1)
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + self.visible_count:
+            self.scroll_to(index - self.visible_count + 1)
+        record = self.rows[index]
+        iid = self._key(record, self.format_row(record))
+        if iid in self._shown:
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+        return "break"